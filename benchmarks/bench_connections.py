@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from quickscribe import NoteStore
+
+# Per-rerun latency of the data layer: connect-per-call vs the shared pool.
+# A "rerun" is what one Streamlit interaction reads: the sidebar folder list
+# and one note listing. Both arms run against the same already-migrated
+# database, so the difference is connection cost alone. The schema DDL the
+# apps used to run on every rerun is timed as its own line.
+
+FOLDERS = 20
+NOTES = 2000
+RERUNS = 300
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS folders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE
+    )""",
+    """CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        heading TEXT NOT NULL,
+        description TEXT,
+        folder_id INTEGER,
+        color TEXT DEFAULT '#FFFFE0',
+        body_color TEXT DEFAULT '#FFFFFF',
+        note_date DATE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE
+    )""",
+]
+FOLDERS_SQL = "SELECT id, name FROM folders ORDER BY name"
+NOTES_SQL = ("SELECT id, heading, description, color, body_color"
+             " FROM notes WHERE folder_id = ? AND note_date IS NULL"
+             " ORDER BY created_at DESC")
+
+
+def seed(path):
+    conn = sqlite3.connect(path)
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+    conn.executemany("INSERT INTO folders (name) VALUES (?)",
+                     [(f"Folder {i}",) for i in range(FOLDERS)])
+    conn.executemany(
+        "INSERT INTO notes (heading, description, folder_id) VALUES (?, ?, ?)",
+        [(f"Note {i}", f"<p>Body of note {i}</p>", i % FOLDERS + 1) for i in range(NOTES)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def schema_per_rerun(path, folder_id):
+    conn = sqlite3.connect(path)
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+    conn.commit()
+    conn.close()
+
+
+def rerun_connect_per_call(path, folder_id):
+    conn = sqlite3.connect(path)
+    conn.execute(FOLDERS_SQL).fetchall()
+    conn.close()
+    conn = sqlite3.connect(path)
+    conn.execute(NOTES_SQL, (folder_id,)).fetchall()
+    conn.close()
+
+
+def rerun_pooled(store, folder_id):
+    # The store was created (and the schema migrated) once, as in the apps
+    with store.pool.connection() as conn:
+        conn.execute(FOLDERS_SQL).fetchall()
+    with store.pool.connection() as conn:
+        conn.execute(NOTES_SQL, (folder_id,)).fetchall()
+
+
+def measure(fn, target):
+    timings = []
+    for i in range(RERUNS):
+        start = time.perf_counter()
+        fn(target, i % FOLDERS + 1)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.mean(timings), timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path)
+        store = NoteStore(path, blob_dir=os.path.join(tmp, "blobs"))
+        print(f"{NOTES} notes in {FOLDERS} folders, {RERUNS} reruns")
+        print(f"{'mode':<20}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, fn, target in [("connect-per-call", rerun_connect_per_call, path),
+                                 ("pooled", rerun_pooled, store),
+                                 ("schema DDL only", schema_per_rerun, path)]:
+            mean, p50, p99 = measure(fn, target)
+            print(f"{name:<20}{mean:>10.3f}{p50:>10.3f}{p99:>10.3f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
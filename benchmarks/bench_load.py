@@ -0,0 +1,248 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import corpus
+
+from quickscribe import NoteStore
+
+# Concurrent-session load generator for write contention on one notes.db.
+# Every simulated session loops over "reruns": NoteStore.sync() followed by
+# one operation drawn from the mix. Sessions are threads sharing one store,
+# as in a single Streamlit server, and --processes runs several such servers
+# against the same file, each with its own store.
+#
+#   python benchmarks/bench_load.py --processes 1 --threads 16 --mix balanced
+#   python benchmarks/bench_load.py --processes 4 --threads 4 --mix write-heavy --output load.json
+#
+# Reports throughput, p50/p99 latency per operation and the rate of
+# "database is locked" / "busy" errors.
+
+MIXES = {
+    "read-only": "get_folders=10,get_notes_by_folder=50,get_notes_by_date=10,get_note=20,search_notes=10",
+    "read-heavy": "get_folders=10,get_notes_by_folder=45,get_notes_by_date=10,get_note=15,search_notes=10,"
+                  "add_note=5,update_note=4,delete_note=1",
+    "balanced": "get_folders=5,get_notes_by_folder=30,get_notes_by_date=5,get_note=10,search_notes=5,"
+                "add_note=20,update_note=20,delete_note=5",
+    "write-heavy": "get_notes_by_folder=15,get_note=5,add_note=40,update_note=30,delete_note=10",
+}
+WRITES = {"add_note", "update_note", "delete_note"}
+
+
+def parse_mix(spec):
+    spec = MIXES.get(spec, spec)
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown operation {name!r}")
+        mix[name] = float(weight)
+    return mix
+
+
+def _body(rng):
+    return corpus.body_html(rng, corpus.body_size(rng, corpus.DEFAULTS["body_bytes"]))
+
+
+class Session:
+    def __init__(self, store, targets, seed):
+        self.store = store
+        self.targets = targets
+        self.rng = random.Random(seed)
+        self.added = []
+
+    def get_folders(self):
+        self.store.get_folders()
+
+    def get_notes_by_folder(self):
+        self.store.get_notes_by_folder(self.rng.choice(self.targets["folders"]))
+
+    def get_notes_by_date(self):
+        self.store.get_notes_by_date(self.rng.choice(self.targets["dates"]))
+
+    def get_note(self):
+        self.store.get_note(self.rng.choice(self.targets["notes"]))
+
+    def search_notes(self):
+        self.store.search_notes(self.rng.choice(corpus.WORDS[:500]))
+
+    def add_note(self):
+        self.added.append(self.store.add_note("Load test", _body(self.rng), self.rng.choice(self.targets["folders"])))
+
+    def update_note(self):
+        self.store.update_note(self.rng.choice(self.targets["notes"]), "Load test", _body(self.rng),
+                               "#FFFFE0", "#FFFFFF")
+
+    def delete_note(self):
+        # Only the session's own notes, so the corpus the other sessions read
+        # stays intact (run_session adds one instead while there are none)
+        self.store.delete_note(self.added.pop(self.rng.randrange(len(self.added))))
+
+
+OPERATIONS = [name for name in vars(Session) if not name.startswith("_")]
+
+
+def _outcome(error):
+    message = str(error).lower()
+    return "locked" if "locked" in message or "busy" in message else "error"
+
+
+def run_session(store, targets, mix, seed, deadline, think_ms, samples):
+    session = Session(store, targets, seed)
+    names, weights = list(mix), list(mix.values())
+    while time.time() < deadline:
+        name = session.rng.choices(names, weights)[0]
+        if name == "delete_note" and not session.added:
+            name = "add_note"
+        start = time.perf_counter()
+        try:
+            store.sync()
+            getattr(session, name)()
+            outcome = "ok"
+        except Exception as e:
+            # Anything else (WriterBusy, a closed writer, an IntegrityError)
+            # is counted too rather than silently ending the session
+            outcome = _outcome(e)
+        samples.append((name, (time.perf_counter() - start) * 1000, outcome))
+        if think_ms:
+            time.sleep(session.rng.uniform(0, 2 * think_ms) / 1000)
+
+
+def run_process(db_file, targets, mix, threads, use_writer, seed, start_at, duration, think_ms):
+    # One "server": a store shared by `threads` sessions
+    store = NoteStore(db_file, blob_dir=os.path.join(os.path.dirname(db_file), "blobs"), writer=use_writer)
+    samples = []
+    time.sleep(max(0.0, start_at - time.time()))
+    workers = [
+        threading.Thread(target=run_session, args=(store, targets, mix, seed * 1000 + i,
+                                                   start_at + duration, think_ms, samples))
+        for i in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if store.writer is not None:
+        print(f"writer: {store.writer.stats()}", file=sys.stderr)
+    store.close()
+    return samples
+
+
+def _targets(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return {
+            "notes": [row[0] for row in conn.execute("SELECT id FROM notes")],
+            "folders": [None] + [row[0] for row in conn.execute("SELECT id FROM folders")],
+            "dates": [row[0] for row in conn.execute(
+                "SELECT DISTINCT note_date FROM notes WHERE note_date IS NOT NULL")] or ["2024-01-01"],
+        }
+    finally:
+        conn.close()
+
+
+def _pct(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+
+def summarize(samples, duration):
+    by_op = {}
+    for name, ms, outcome in samples:
+        by_op.setdefault(name, []).append((ms, outcome))
+
+    def stats(entries):
+        latencies = sorted(ms for ms, outcome in entries if outcome == "ok")
+        locked = sum(outcome == "locked" for _, outcome in entries)
+        return {
+            "n": len(entries),
+            "ok": len(latencies),
+            "locked": locked,
+            "errors": sum(outcome == "error" for _, outcome in entries),
+            "lock_rate": locked / len(entries) if entries else 0.0,
+            "per_s": len(latencies) / duration,
+            "p50_ms": _pct(latencies, 0.50),
+            "p99_ms": _pct(latencies, 0.99),
+            "max_ms": latencies[-1] if latencies else None,
+        }
+    return {
+        "all": stats([(ms, outcome) for _, ms, outcome in samples]),
+        "reads": stats([(ms, outcome) for name, ms, outcome in samples if name not in WRITES]),
+        "writes": stats([(ms, outcome) for name, ms, outcome in samples if name in WRITES]),
+        "operations": {name: stats(entries) for name, entries in sorted(by_op.items())},
+    }
+
+
+def _fmt(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def report(summary):
+    print(f"{'operation':<22}{'n':>8}{'ok/s':>9}{'locked':>8}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>10}")
+    rows = list(summary["operations"].items()) + [("reads", summary["reads"]), ("writes", summary["writes"]),
+                                                   ("all", summary["all"])]
+    for name, s in rows:
+        print(f"{name:<22}{s['n']:>8}{s['per_s']:>9.1f}{s['locked']:>8}{s['errors']:>8}"
+              f"{_fmt(s['p50_ms']):>9}{_fmt(s['p99_ms']):>9}{_fmt(s['max_ms']):>10}")
+    print(f"lock errors: {summary['all']['lock_rate']:.2%} of operations")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=1, help="servers sharing the database file")
+    parser.add_argument("--threads", type=int, default=8, help="sessions per server")
+    parser.add_argument("--mix", default="balanced",
+                        help=f"{', '.join(MIXES)} or weights like 'get_note=80,update_note=20'")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a session's operations")
+    parser.add_argument("--notes", type=int, default=10_000, help="corpus size")
+    parser.add_argument("--writer", action="store_true", help="batch note writes through the writer thread")
+    parser.add_argument("--db", help="run against a copy of this database instead of a generated corpus")
+    parser.add_argument("--output", help="write the summary as JSON")
+    parser.add_argument("--cache-dir", default=corpus.CACHE_DIR)
+    corpus.add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    source = args.db or corpus.cached(args.cache_dir, args.workers, notes=args.notes, **corpus.params_from(args))[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "notes.db")
+        shutil.copyfile(source, db_file)
+        targets = _targets(db_file)
+        # Create the store once up front so migrations do not race the run
+        NoteStore(db_file, blob_dir=os.path.join(tmp, "blobs")).close()
+
+        start_at = time.time() + 0.5 + 0.2 * args.processes
+        job = (db_file, targets, mix, args.threads, args.writer)
+        if args.processes == 1:
+            samples = run_process(*job, args.seed, start_at, args.duration, args.think_ms)
+        else:
+            with multiprocessing.Pool(args.processes) as pool:
+                parts = pool.starmap(run_process, [
+                    (*job, args.seed + p, start_at, args.duration, args.think_ms) for p in range(args.processes)
+                ])
+            samples = [sample for part in parts for sample in part]
+
+    summary = summarize(samples, args.duration)
+    print(f"{args.processes} process(es) x {args.threads} session(s), mix {args.mix}, {args.duration:g}s"
+          + (", writer thread" if args.writer else ""))
+    report(summary)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "mix": mix, "summary": summary}, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from corpus import CUM_WEIGHTS, WORDS
+
+from quickscribe import NoteStore
+from quickscribe.search import SEARCH_PAGE_SIZE
+
+# Full-text search latency on a synthetic corpus (500k notes by default).
+# Notes are inserted through the normal triggers, so build time also shows
+# the cost of keeping notes_fts in sync.
+
+QUERIES = [
+    WORDS[0],                   # most common word
+    WORDS[50],                  # common
+    WORDS[2000],                # rare
+    f"{WORDS[10]} {WORDS[400]}",  # two words, AND
+    WORDS[3000][:4],            # prefix, as typed
+    "nosuchword",
+]
+RUNS = 50
+
+
+def build(store, notes, seed):
+    rng = random.Random(seed)
+    for start in range(0, notes, 10_000):
+        batch = []
+        for _ in range(min(10_000, notes - start)):
+            heading = " ".join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=3))
+            text = " ".join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=rng.randint(20, 120)))
+            batch.append((heading, f"<p>{text}</p>", text[:200], text))
+        with store.pool.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO notes (heading, description, preview, search_text) VALUES (?, ?, ?, ?)",
+                batch
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        store = NoteStore(os.path.join(tmp, "search.db"), blob_dir=os.path.join(tmp, "blobs"))
+        build(store, args.notes, args.seed)
+        print(f"built {args.notes} notes in {time.perf_counter() - start:.1f}s")
+        print(f"{'query':<24}{'rows':>8}{'p50 ms':>10}{'p99 ms':>10}{'page 5 ms':>11}")
+        for text in QUERIES:
+            timings = []
+            for _ in range(RUNS):
+                start = time.perf_counter()
+                rows, _ = store.search_notes(text)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            start = time.perf_counter()
+            store.search_notes(text, cursor=4 * SEARCH_PAGE_SIZE)
+            deep = (time.perf_counter() - start) * 1000
+            print(f"{text:<24}{len(rows):>8}{timings[len(timings) // 2]:>10.2f}"
+                  f"{timings[int(len(timings) * 0.99)]:>10.2f}{deep:>11.2f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import corpus
+
+from quickscribe import LRUCache, NoteStore, cards
+
+# Reproducible benchmark suite: the NoteStore operations behind every rerun,
+# timed on generated corpora of each size, with machine-readable results so
+# two commits can be compared.
+#
+#   python benchmarks/bench_suite.py --output before.json
+#   ... change something ...
+#   python benchmarks/bench_suite.py --output after.json --compare before.json
+#
+# Corpora are cached in benchmarks/.corpus (the 1M-note one takes a while to
+# build the first time); each run works on a fresh copy. "cold" reads clear
+# the store's read cache before every call, so they measure SQLite rather
+# than a dict lookup.
+
+SIZES = [1_000, 100_000, 1_000_000]
+REPEAT = 30
+# A regression is a p50 slower by more than THRESHOLD and by more than
+# NOISE_MS, so sub-millisecond jitter on cached paths is not reported.
+THRESHOLD = 0.25
+NOISE_MS = 0.05
+
+
+def measure(fn, repeat, setup=None):
+    # fn(*setup()) timed repeat times after one untimed warm-up
+    samples = []
+    for i in range(repeat + 1):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        if i:
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    samples = sorted(samples)
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+    return {
+        "n": len(samples),
+        "mean_ms": sum(samples) / len(samples),
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p99_ms": pct(0.99),
+        "min_ms": samples[0],
+        "max_ms": samples[-1],
+    }
+
+
+def _page(store, folder_id, number):
+    # Cursor of the given 0-based page, walked untimed
+    cursor = None
+    for _ in range(number):
+        _, cursor = store.get_notes_by_folder(folder_id, cursor)
+    return cursor
+
+
+def run(store, repeat, seed):
+    rng = random.Random(seed)
+    with store.pool.connection() as conn:
+        note_ids = [row[0] for row in conn.execute("SELECT id FROM notes ORDER BY id")]
+        busiest = conn.execute(
+            "SELECT folder_id FROM notes WHERE folder_id IS NOT NULL AND note_date IS NULL"
+            " GROUP BY folder_id ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()[0]
+        busiest_date = conn.execute(
+            "SELECT note_date FROM notes WHERE note_date IS NOT NULL"
+            " GROUP BY note_date ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()[0]
+    folder_ids = [folder_id for folder_id, _ in store.get_folders()]
+    cold = store.read_cache.clear
+    results = {}
+
+    def bench(name, fn, setup=None):
+        results[name] = summarize(measure(fn, repeat, setup))
+
+    def cold_setup(*args):
+        def setup():
+            cold()
+            return args
+        return setup
+
+    def random_folder_cold():
+        cold()
+        return (rng.choice(folder_ids),)
+
+    # Reads
+    bench("get_folders cold", store.get_folders, cold_setup())
+    bench("get_folders cached", store.get_folders)
+    bench("get_notes_by_folder cold", store.get_notes_by_folder, cold_setup(busiest))
+    bench("get_notes_by_folder cached", store.get_notes_by_folder, lambda: (busiest,))
+    bench("get_notes_by_folder page 5 cold", store.get_notes_by_folder, cold_setup(busiest, _page(store, busiest, 4)))
+    bench("get_notes_by_folder random cold", store.get_notes_by_folder, random_folder_cold)
+    bench("get_notes_by_folder home+dated cold", lambda: store.get_notes_by_folder(None, include_dated=True),
+          cold_setup())
+    bench("get_notes_by_date cold", store.get_notes_by_date, cold_setup(busiest_date))
+    month = busiest_date[:8] + "01"
+    month_end = (datetime.date.fromisoformat(month) + datetime.timedelta(days=31)).replace(day=1).isoformat()
+    bench("get_day_counts month cold", store.get_day_counts, cold_setup(month, month_end))
+    bench("get_day_counts year cold", store.get_day_counts, cold_setup(busiest_date[:4] + "-01-01",
+                                                                       f"{int(busiest_date[:4]) + 1}-01-01"))
+    bench("get_notes_in_range month cold", store.get_notes_in_range, cold_setup(month, month_end))
+    popular = [name for name, _ in sorted(store.get_tags(), key=lambda tag: -tag[1])]
+    if len(popular) >= 30:
+        # Three common tags (dense matches) and three from the long tail
+        for label, tags in [("common", popular[:3]), ("rare", popular[20:30:4])]:
+            bench(f"get_notes_by_tags 3 {label} AND cold", store.get_notes_by_tags, cold_setup(tags, True))
+            bench(f"get_notes_by_tags 3 {label} OR cold", store.get_notes_by_tags, cold_setup(tags, False))
+    bench("get_note", store.get_note, lambda: (rng.choice(note_ids),))
+    bench("search_notes", store.search_notes, lambda: (rng.choice(corpus.WORDS[:500]),))
+
+    # Card rendering, as the apps do it: a page of closed cards through the
+    # shared card cache, and one opened card (which reads the full body)
+    page, _ = store.get_notes_by_folder(busiest)
+    card_cache = LRUCache(4096)
+
+    def render_page(cache):
+        for card in page:
+            cache.get_or_build((card.id, card.revision, False),
+                               lambda: cards.render_card(store, card, False))
+    bench("render_cards cold", render_page, lambda: (LRUCache(4096),))
+    bench("render_cards cached", render_page, lambda: (card_cache,))
+    bench("render_card opened", cards.render_card, lambda: (store, rng.choice(page), True))
+
+    # Writes, on bodies from the corpus generator
+    body_rng = random.Random(seed + 1)
+
+    def new_body():
+        return (corpus.body_html(body_rng, corpus.body_size(body_rng, corpus.DEFAULTS["body_bytes"])),)
+    bench("add_note", lambda body: store.add_note("Benchmark", body, rng.choice(folder_ids)), new_body)
+    bench("update_note", lambda body: store.update_note(rng.choice(note_ids), "Benchmark", body, "#FFFFE0", "#FFFFFF"),
+          new_body)
+
+    def folder_with_notes():
+        folder_id = store.add_folder(f"benchmark {time.perf_counter_ns()}")
+        for _ in range(20):
+            store.add_note("Benchmark", "<p>x</p>", folder_id)
+        return (folder_id,)
+    bench("delete_folder", store.delete_folder, folder_with_notes)
+    return results
+
+
+def git_state():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def compare(results, baseline, threshold):
+    # Prints p50 changes per size and operation; returns the regressions
+    regressions = []
+    if baseline.get("meta", {}).get("corpus") != results["meta"]["corpus"]:
+        print("warning: the baseline was run on a different corpus", file=sys.stderr)
+    print(f"\n{'size':>9}  {'operation':<38}{'base p50':>10}{'p50':>10}{'change':>9}")
+    for size, ops in results["sizes"].items():
+        for name, stats in ops.items():
+            base = baseline.get("sizes", {}).get(size, {}).get(name)
+            if base is None:
+                continue
+            before, after = base["p50_ms"], stats["p50_ms"]
+            change = after / before - 1 if before else 0.0
+            flag = ""
+            if change > threshold and after - before > NOISE_MS:
+                flag = "  REGRESSION"
+                regressions.append((size, name))
+            print(f"{size:>9}  {name:<38}{before:>10.3f}{after:>10.3f}{change:>+9.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="p50 slowdown reported as a regression (default 0.25)")
+    parser.add_argument("--cache-dir", default=corpus.CACHE_DIR)
+    corpus.add_arguments(parser)
+    args = parser.parse_args()
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    commit, dirty = git_state()
+    params = corpus.params_from(args)
+    results = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "corpus": dict(params, version=corpus.CORPUS_VERSION),
+        },
+        "corpora": {},
+        "sizes": {},
+    }
+    for size in args.sizes:
+        path, build_seconds = corpus.cached(args.cache_dir, args.workers, notes=size, **params)
+        if build_seconds is not None:
+            print(f"built {size}-note corpus in {build_seconds:.1f}s", file=sys.stderr)
+        results["corpora"][str(size)] = {"file": os.path.basename(path), "bytes": os.path.getsize(path),
+                                         "build_s": build_seconds}
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, "notes.db")
+            shutil.copyfile(path, db_file)
+            store = NoteStore(db_file)
+            try:
+                results["sizes"][str(size)] = run(store, args.repeat, args.seed)
+            finally:
+                store.close()
+        print(f"\n{size} notes")
+        print(f"  {'operation':<38}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+        for name, stats in results["sizes"][str(size)].items():
+            print(f"  {name:<38}{stats['p50_ms']:>10.3f}{stats['p90_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    if baseline is not None:
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
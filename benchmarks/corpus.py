@@ -0,0 +1,233 @@
+import argparse
+import base64
+import datetime
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from quickscribe import NoteStore, bulk
+
+# Deterministic synthetic notes databases for the benchmarks.
+# The same parameters and seed always give the same records: folders with a
+# Zipf-like spread of notes (plus Home), dated notes for the date view,
+# Quill-style HTML bodies with a lognormal size spread around body_bytes, and
+# a fraction of notes embedding a PNG drawn from a small pool, so the blob
+# store deduplicates as it does with real pasted screenshots, and up to three
+# tags per note from a Zipf-weighted vocabulary. Databases are
+# built through bulk.import_records, i.e. the same write path as an import.
+#
+#   python benchmarks/corpus.py out.db --notes 100000
+
+# Bump when the generator changes, so cached corpora are rebuilt
+CORPUS_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".corpus")
+
+# 8000 synthetic words drawn with Zipf-like weights, so a few words are very
+# common and most are rare, as in real text.
+SYLLABLES = ["ka", "lo", "mi", "ne", "pu", "ra", "si", "to", "ba", "de",
+             "fi", "go", "hu", "ja", "ke", "lu", "mo", "ni", "po", "ru"]
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(WORDS))))
+
+BANNER_COLORS = ["#FFFFE0", "#FFD1DC", "#C1E1C1", "#AEC6CF", "#FDFD96", "#CBAACB", "#FFB347"]
+BODY_COLORS = ["#FFFFFF", "#FFFFFF", "#FFFFFF", "#F5F5F5", "#FFF8E7", "#1E1E1E"]
+IMAGE_POOL = 50
+FIRST_DAY = datetime.datetime(2022, 1, 1)
+LAST_DAY = datetime.datetime(2024, 12, 31, 23, 59, 59)
+
+DEFAULTS = {
+    "notes": 1000,
+    "folders": 50,
+    "body_bytes": 1500,
+    "image_fraction": 0.02,
+    "dated_fraction": 0.2,
+    "tags": 200,
+    "seed": 1,
+}
+
+
+def _words(rng, k):
+    return " ".join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=k))
+
+
+def _png(rng, size):
+    # A real, decodable RGB PNG of random pixels (so it does not compress)
+    raw = b"".join(b"\x00" + rng.randbytes(size * 3) for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def image_pool(seed, count=IMAGE_POOL):
+    rng = random.Random(f"images-{seed}")
+    return [f"data:image/png;base64,{base64.b64encode(_png(rng, rng.choice([16, 32, 48]))).decode('ascii')}"
+            for _ in range(count)]
+
+
+def _inline(rng, k):
+    text = _words(rng, k)
+    roll = rng.random()
+    if roll < 0.15:
+        head, _, tail = text.partition(" ")
+        return f"<strong>{head}</strong> {tail}"
+    if roll < 0.25:
+        head, _, tail = text.rpartition(" ")
+        return f"{head} <em>{tail}</em>"
+    return text
+
+
+def _block(rng):
+    # The block formats Quill produces, weighted towards plain paragraphs
+    roll = rng.random()
+    if roll < 0.60:
+        return f"<p>{_inline(rng, rng.randint(8, 40))}</p>"
+    if roll < 0.70:
+        return f"<h2>{_words(rng, rng.randint(2, 5))}</h2>"
+    if roll < 0.80:
+        items = "".join(f"<li>{_inline(rng, rng.randint(3, 12))}</li>" for _ in range(rng.randint(2, 5)))
+        return f"<ul>{items}</ul>" if rng.random() < 0.6 else f"<ol>{items}</ol>"
+    if roll < 0.87:
+        return f"<blockquote>{_words(rng, rng.randint(6, 20))}</blockquote>"
+    if roll < 0.92:
+        return f'<pre class="ql-syntax" spellcheck="false">{_words(rng, rng.randint(4, 16))}</pre>'
+    return "<p><br></p>"
+
+
+def body_html(rng, target_bytes, image=None):
+    blocks = []
+    size = 0
+    while size < target_bytes:
+        block = _block(rng)
+        blocks.append(block)
+        size += len(block)
+    if image:
+        blocks.insert(rng.randint(0, len(blocks)), f'<p><img src="{image}"></p>')
+    return "".join(blocks)
+
+
+def body_size(rng, body_bytes):
+    # Mostly short notes with a long tail of big ones
+    return int(min(max(rng.lognormvariate(math.log(body_bytes), 0.8), 40), body_bytes * 50))
+
+
+def folder_names(folders, seed):
+    rng = random.Random(f"folders-{seed}")
+    return [f"{_words(rng, 2).title()} {i}" for i in range(folders)]
+
+
+def tag_names(tags, seed):
+    rng = random.Random(f"tags-{seed}")
+    return [f"{_words(rng, 1)}-{i}" for i in range(tags)]
+
+
+def records(notes=DEFAULTS["notes"], folders=DEFAULTS["folders"], body_bytes=DEFAULTS["body_bytes"],
+            image_fraction=DEFAULTS["image_fraction"], dated_fraction=DEFAULTS["dated_fraction"],
+            tags=DEFAULTS["tags"], seed=DEFAULTS["seed"]):
+    # Yields JSONL-format records (see quickscribe/bulk.py): folders, then notes
+    rng = random.Random(seed)
+    names = folder_names(folders, seed)
+    for name in names:
+        yield {"type": "folder", "name": name}
+    images = image_pool(seed) if image_fraction else []
+    # Home first, then folders by decreasing size
+    homes = [None] + names
+    home_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(homes))))
+    span = (LAST_DAY - FIRST_DAY).total_seconds()
+    # Tags come from their own generator, so the rest of a corpus does not
+    # depend on the tag settings
+    vocabulary = tag_names(tags, seed)
+    tag_rng = random.Random(f"note-tags-{seed}")
+    tag_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for _ in range(notes):
+        created = FIRST_DAY + datetime.timedelta(seconds=int(rng.random() * span))
+        dated = rng.random() < dated_fraction
+        image = rng.choice(images) if images and rng.random() < image_fraction else None
+        yield {
+            "type": "note",
+            "heading": _words(rng, rng.randint(2, 6)).capitalize(),
+            "description": body_html(rng, body_size(rng, body_bytes), image),
+            "folder": None if dated else rng.choices(homes, cum_weights=home_weights)[0],
+            "color": rng.choice(BANNER_COLORS),
+            "body_color": rng.choice(BODY_COLORS),
+            "note_date": created.date().isoformat() if dated else None,
+            "created_at": created.strftime("%Y-%m-%d %H:%M:%S"),
+            "tags": sorted(set(tag_rng.choices(vocabulary, cum_weights=tag_weights, k=tag_rng.randint(0, 3))))
+                    if vocabulary else [],
+        }
+
+
+def build(db_file, workers=1, progress=None, **params):
+    store = NoteStore(db_file)
+    try:
+        return bulk.import_records(store, records(**params), workers=workers, progress=progress)
+    finally:
+        store.close()
+
+
+def cache_key(params):
+    spec = dict(DEFAULTS, **params, version=CORPUS_VERSION)
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def cached(cache_dir=CACHE_DIR, workers=1, progress=None, **params):
+    # Path of a corpus database with these parameters, built on first use.
+    # Returns (path, build seconds or None if it was already there).
+    params = dict(DEFAULTS, **params)
+    path = os.path.join(cache_dir, f"corpus-{params['notes']}-{cache_key(params)}.db")
+    if os.path.exists(path):
+        return path, None
+    os.makedirs(cache_dir, exist_ok=True)
+    partial = path + ".partial"
+    for leftover in (partial, partial + "-wal", partial + "-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    start = time.perf_counter()
+    build(partial, workers, progress, **params)
+    os.replace(partial, path)
+    return path, time.perf_counter() - start
+
+
+def add_arguments(parser):
+    parser.add_argument("--folders", type=int, default=DEFAULTS["folders"])
+    parser.add_argument("--body-bytes", type=int, default=DEFAULTS["body_bytes"],
+                        help="median note body size")
+    parser.add_argument("--image-fraction", type=float, default=DEFAULTS["image_fraction"])
+    parser.add_argument("--dated-fraction", type=float, default=DEFAULTS["dated_fraction"])
+    parser.add_argument("--tags", type=int, default=DEFAULTS["tags"], help="tag vocabulary size (0: untagged)")
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+    parser.add_argument("--workers", type=int, default=1)
+
+
+def params_from(args):
+    return {"folders": args.folders, "body_bytes": args.body_bytes, "image_fraction": args.image_fraction,
+            "dated_fraction": args.dated_fraction, "tags": args.tags, "seed": args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("db_file")
+    parser.add_argument("--notes", type=int, default=DEFAULTS["notes"])
+    add_arguments(parser)
+    args = parser.parse_args()
+    if os.path.exists(args.db_file):
+        parser.error(f"{args.db_file} already exists")
+
+    start = time.perf_counter()
+    built = build(args.db_file, args.workers, lambda n: print(f"{n} notes", file=sys.stderr),
+                  notes=args.notes, **params_from(args))
+    print(f"built {built} notes in {time.perf_counter() - start:.1f}s "
+          f"({os.path.getsize(args.db_file) / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
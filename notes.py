@@ -1,146 +1,88 @@
 import streamlit as st
 import sqlite3
+from streamlit.errors import StreamlitAPIException
 from streamlit_quill import st_quill
-import re
-import html  # For escaping heading
-
-# Database setup
-DB_FILE = "notes.db"
-
-def get_text_color(bg_color):
-    try:
-        hex_color = bg_color.lstrip('#')
-        r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-        luminance = (0.299 * r + 0.587 * g + 0.114 * b) / 255
-        return '#000000' if luminance > 0.5 else '#FFFFFF'
-    except:
-        return '#000000'
-
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS folders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            heading TEXT NOT NULL,
-            description TEXT,
-            folder_id INTEGER,
-            color TEXT DEFAULT '#FFFFE0',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            body_color TEXT DEFAULT '#FFFFFF',
-            FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE
-        )
-    """)
-    try:
-        cursor.execute("ALTER TABLE notes ADD COLUMN body_color TEXT DEFAULT '#FFFFFF'")
-    except sqlite3.OperationalError as e:
-        if "duplicate column name" not in str(e).lower():
-            st.warning(f"Could not add body_color column: {e}")
-
-    conn.commit()
-    conn.close()
+import functools
+import html
+import os
+from quickscribe import Draft, LRUCache, NoteStore, cards
+
+@st.cache_resource
+def get_store():
+    # One store per server process; its connection pool and read cache are shared by every session
+    return NoteStore("notes.db", blob_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "blobs"),
+                     export_blobs=True)
+
+@st.cache_resource
+def get_card_cache():
+    # Rendered card HTML keyed on (note_id, revision, opened). Editing a note bumps
+    # its revision, so stale entries are never looked up again and simply age out.
+    return LRUCache(maxsize=4096)
 
 def add_folder(name):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO folders (name) VALUES (?)", (name,))
-        conn.commit()
+        store.add_folder(name)
     except sqlite3.IntegrityError:
         st.error(f"Folder '{name}' already exists.")
-    finally:
-        conn.close()
-
-def get_folders():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name FROM folders ORDER BY name")
-    folders = cursor.fetchall()
-    conn.close()
-    return folders
-
-def delete_folder(folder_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
-    conn.commit()
-    conn.close()
-
-def add_note(heading, description, folder_id=None, banner_color='#FFFFE0', body_color='#FFFFFF'):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cleaned_description = description
-    if cleaned_description is None or cleaned_description.strip() in ["", "<p><br></p>"]:
-        cleaned_description = ""
-    cursor.execute(
-        "INSERT INTO notes (heading, description, folder_id, color, body_color) VALUES (?, ?, ?, ?, ?)",
-        (heading, cleaned_description, folder_id, banner_color, body_color)
-    )
-    conn.commit()
-    conn.close()
-
-def get_notes_by_folder(folder_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    try:
-        if folder_id is None:
-            cursor.execute("SELECT id, heading, description, color, body_color FROM notes WHERE folder_id IS NULL ORDER BY created_at DESC")
-        else:
-            cursor.execute("SELECT id, heading, description, color, body_color FROM notes WHERE folder_id = ? ORDER BY created_at DESC", (folder_id,))
-        notes = cursor.fetchall()
-    except sqlite3.OperationalError as e:
-        if "no such column: body_color" in str(e).lower():
-            if folder_id is None:
-                cursor.execute("SELECT id, heading, description, color FROM notes WHERE folder_id IS NULL ORDER BY created_at DESC")
-            else:
-                cursor.execute("SELECT id, heading, description, color FROM notes WHERE folder_id = ? ORDER BY created_at DESC", (folder_id,))
-            notes_old = cursor.fetchall()
-            notes = [(n[0], n[1], n[2], n[3], '#FFFFFF') for n in notes_old]
-        else:
-            raise
-    conn.close()
-    return notes
-
-def update_note(note_id, heading, description, banner_color, body_color):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cleaned_description = description
-    if cleaned_description is None or cleaned_description.strip() in ["", "<p><br></p>"]:
-        cleaned_description = ""
-    cursor.execute(
-        "UPDATE notes SET heading = ?, description = ?, color = ?, body_color = ? WHERE id = ?",
-        (heading, cleaned_description, banner_color, body_color, note_id)
-    )
-    conn.commit()
-    conn.close()
-
-def delete_note(note_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-    conn.commit()
-    conn.close()
-
-# Initialize DB
-init_db()
+
+def show_profile_panel(trace):
+    # Admin panel, shown when QUICKSCRIBE_PROFILE is set: where this rerun's time went
+    if trace is None:
+        return
+    with st.sidebar.expander("⏱️ Performance"):
+        totals = trace["totals"]
+        st.caption(f"Rerun {trace['ms']:.1f} ms · {totals['statements']} statements · "
+                   f"{totals['sql_ms']:.1f} ms in SQLite · {totals['rows']} rows · {totals['bytes'] / 1024:.1f} KiB")
+        st.table([{"phase": p["name"], "ms": round(p["ms"], 2)} for p in trace["phases"]])
+        calls = {}
+        for span in trace["spans"]:
+            row = calls.setdefault(span["name"], {"call": span["name"], "n": 0, "ms": 0.0, "sql ms": 0.0, "rows": 0, "bytes": 0})
+            row["n"] += 1
+            row["ms"] += span["ms"]
+            row["sql ms"] += span["sql_ms"]
+            row["rows"] += span["rows"]
+            row["bytes"] += span["bytes"]
+        st.table(sorted(calls.values(), key=lambda row: -row["ms"]))
+        st.subheader("Slow statements")
+        slow = store.profiler.slow_statements()
+        if not slow:
+            st.caption(f"None over {store.profiler.slow_ms:g} ms.")
+        for statement in slow[-10:]:
+            st.code(f"-- {statement['ms']:.1f} ms, {statement['rows']} rows\n{statement['sql']}\n-- " + "\n-- ".join(statement.get("plan", [])), language="sql")
+        st.download_button("Export JSONL", store.profiler.to_jsonl(), file_name="quickscribe-profile.jsonl", mime="application/jsonl")
+
+store = get_store()
+store.profiler.start("notes.py")
+# Drop cached listings that other worker processes have changed
+store.sync()
+# Drafts belong to the browser tab: the token in the URL survives a refresh
+if "draft" not in st.query_params:
+    st.query_params["draft"] = os.urandom(8).hex()
+draft_owner = st.query_params["draft"]
 
 # Initialize Session State
-if 'editing_note_id' not in st.session_state:
-    st.session_state.editing_note_id = None
+# Notes in edit mode and opened notes; each card updates its own entry
+if 'editing_note_ids' not in st.session_state:
+    st.session_state.editing_note_ids = set()
 if 'selected_folder_id' not in st.session_state:
     st.session_state.selected_folder_id = None
 if "new_note_heading_value" not in st.session_state:
-    st.session_state["new_note_heading_value"] = ""
-if "new_note_quill_value" not in st.session_state:
-    st.session_state["new_note_quill_value"] = ""
+    # The new note as it was autosaved before a refresh, if any
+    new_note_draft = store.get_draft(draft_owner, 0) or Draft("", "", "")
+    st.session_state["new_note_heading_value"] = new_note_draft.heading
+    st.session_state["new_note_quill_value"] = new_note_draft.description
+    st.session_state["new_note_tags_value"] = new_note_draft.tags
 if 'quill_key_suffix' not in st.session_state:
     st.session_state.quill_key_suffix = 0
+if 'open_note_ids' not in st.session_state:
+    st.session_state.open_note_ids = set()
+# Cards changed since the grid last ran (None once deleted)
+if 'changed_cards' not in st.session_state:
+    st.session_state.changed_cards = {}
+if 'notes_listing' not in st.session_state:
+    st.session_state.notes_listing = None
+if 'notes_pages' not in st.session_state:
+    st.session_state.notes_pages = 1
 
 # Streamlit Page Setup
 st.set_page_config(page_title="QuickScribe", layout="wide")
@@ -171,51 +113,272 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Sidebar: Folder Management
-with st.sidebar:
+# Fragments: the sidebar, the note grid and each card rerun on their own, so
+# an edit or delete re-fetches and redraws only the card it touched. Changes
+# that affect the rest of the page (choosing a folder, adding a note) still
+# rerun the whole script.
+
+def rerun_fragment():
+    # A click normally reruns just its fragment; one that arrives with a full
+    # rerun (e.g. queued behind another interaction) reruns the page instead
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+@st.fragment
+@store.profiler.fragment
+def folder_sidebar():
     st.title("Folders")
     with st.form("new_folder_form", clear_on_submit=True):
         new_folder_name = st.text_input("New Folder Name")
         add_folder_submitted = st.form_submit_button("Add Folder")
         if add_folder_submitted and new_folder_name:
             add_folder(new_folder_name)
-            st.rerun()
+            rerun_fragment()
 
     st.divider()
-    folders = get_folders()
+    folders = store.get_folders()
+    note_counts = store.get_folder_counts()
 
     if st.button("🏠 Home", use_container_width=True, type="secondary" if st.session_state.selected_folder_id is None else "primary"):
-        st.session_state.selected_folder_id = None
-        st.session_state.editing_note_id = None
-        st.session_state["new_note_heading_value"] = ""
-        st.session_state["new_note_quill_value"] = ""
-        st.session_state.quill_key_suffix += 1
-        st.rerun()
+        select_folder(None)
 
     st.write("Your Folders:")
     for folder_id, folder_name in folders:
         folder_cols = st.columns([0.7, 0.3])
         with folder_cols[0]:
-            if st.button(folder_name, key=f"select_folder_{folder_id}", use_container_width=True, type="secondary" if st.session_state.selected_folder_id == folder_id else "primary"):
-                st.session_state.selected_folder_id = folder_id
-                st.session_state.editing_note_id = None
-                st.session_state["new_note_heading_value"] = ""
-                st.session_state["new_note_quill_value"] = ""
-                st.session_state.quill_key_suffix += 1
-                st.rerun()
+            if st.button(f"{folder_name} ({note_counts.get(folder_id, 0)})", key=f"select_folder_{folder_id}", use_container_width=True, type="secondary" if st.session_state.selected_folder_id == folder_id else "primary"):
+                select_folder(folder_id)
         with folder_cols[1]:
             if st.button("🗑️", key=f"delete_folder_{folder_id}", help=f"Delete folder '{folder_name}'"):
-                delete_folder(folder_id)
+                store.delete_folder(folder_id)
                 if st.session_state.selected_folder_id == folder_id:
-                    st.session_state.selected_folder_id = None
+                    select_folder(None)
+                rerun_fragment()
+
+def select_folder(folder_id):
+    st.session_state.selected_folder_id = folder_id
+    st.session_state.editing_note_ids.clear()
+    st.session_state["new_note_heading_value"] = ""
+    st.session_state["new_note_quill_value"] = ""
+    st.session_state["new_note_tags_value"] = ""
+    st.session_state.quill_key_suffix += 1
+    st.rerun()
+
+@st.fragment
+@store.profiler.fragment
+def note_grid(listing, fetch_page, empty_message):
+    # The listing is read fresh here, so earlier per-card changes are in it
+    st.session_state.changed_cards = {}
+    # Pagination: start over at one page whenever the listing changes
+    if st.session_state.notes_listing != listing:
+        st.session_state.notes_listing = listing
+        st.session_state.notes_pages = 1
+    notes, next_cursor = [], None
+    for _ in range(st.session_state.notes_pages):
+        page, next_cursor = fetch_page(next_cursor)
+        notes.extend(page)
+        if next_cursor is None:
+            break
+
+    if not notes:
+        st.info(empty_message)
+        return
+    num_columns = 3
+    cols = st.columns(num_columns)
+    for i, note_data in enumerate(notes):
+        with cols[i % num_columns]:
+            note_card(note_data)
+
+    if next_cursor is not None:
+        if st.button("Load more", key="load_more_notes"):
+            st.session_state.notes_pages += 1
+            rerun_fragment()
+
+def card_changed(note_id):
+    # Redraw just this card from its current row
+    st.session_state.changed_cards[note_id] = store.get_card(note_id)
+    rerun_fragment()
+
+def form_draft(heading, description, tags):
+    # What a note form holds, None while it is empty
+    if heading or tags.strip() or (description or "").strip() not in ["", "<p><br></p>"]:
+        return Draft(heading, description or "", tags)
+    return None
+
+def close_editor(note_id):
+    store.discard_draft(draft_owner, note_id)
+    st.session_state.editing_note_ids.discard(note_id)
+    st.session_state.pop(f"edit_start_{note_id}", None)
+    st.session_state.pop(f"history_diff_{note_id}", None)
+
+def note_history(note_id, revisions):
+    # Earlier versions of the note being edited. The diff against the current
+    # one is only built when asked for, not on every rerun of the form.
+    if not revisions:
+        return
+    with st.expander("🕘 History"):
+        chosen = st.selectbox(
+            "Version", revisions, key=f"history_{note_id}",
+            format_func=lambda r: f"{r.saved_at or 'before history'} · {r.heading}"
+        )
+        if st.button("Show changes", key=f"history_show_{note_id}"):
+            st.session_state[f"history_diff_{note_id}"] = (chosen.revision, store.diff_revisions(note_id, chosen.revision))
+        shown = st.session_state.get(f"history_diff_{note_id}")
+        if shown and shown[0] == chosen.revision:
+            st.code(shown[1], language="diff")
+        if st.button("Restore this version", key=f"restore_{note_id}"):
+            store.restore_revision(note_id, chosen.revision)
+            close_editor(note_id)
+            st.success("Note restored!")
+            card_changed(note_id)
+
+@st.fragment
+@store.profiler.fragment
+def new_note_form(current_folder_name):
+    # Not an st.form: every change reruns just this fragment and autosaves
+    # the new note as a draft, restored if the page is refreshed
+    suffix = st.session_state.quill_key_suffix
+    with st.container(border=True):
+        note_heading = st.text_input("Note Heading", max_chars=100, value=st.session_state["new_note_heading_value"], key=f"new_note_heading_{suffix}")
+        note_tags = st.text_input("Tags", placeholder="comma-separated, e.g. work, ideas", value=st.session_state["new_note_tags_value"], key=f"new_note_tags_{suffix}")
+        with store.profiler.span("st_quill"):
+            note_description_html = st_quill(
+                placeholder="Enter note description...", html=True,
+                key=f"new_note_quill_{suffix}",
+                value=st.session_state["new_note_quill_value"]
+            )
+        col1, col2 = st.columns(2)
+        with col1:
+            new_banner_color = st.color_picker("Banner Color", value='#FFFFE0', key=f"new_note_banner_{suffix}")
+        with col2:
+            new_body_color = st.color_picker("Body Color", value='#FFFFFF', key=f"new_note_body_{suffix}")
+        store.save_draft(draft_owner, 0, form_draft(note_heading, note_description_html, note_tags))
+
+        if st.button("Add Note", key=f"add_note_{suffix}"):
+            if note_heading:
+                store.add_note(note_heading, note_description_html, st.session_state.selected_folder_id, new_banner_color, new_body_color,
+                               tags=note_tags.split(","))
+                store.discard_draft(draft_owner, 0)
+                st.success(f"Note added to '{current_folder_name}'!")
                 st.session_state["new_note_heading_value"] = ""
                 st.session_state["new_note_quill_value"] = ""
+                st.session_state["new_note_tags_value"] = ""
+                st.session_state.editing_note_ids.clear()
                 st.session_state.quill_key_suffix += 1
                 st.rerun()
+            else:
+                st.warning("Note heading cannot be empty.")
+
+@st.fragment
+@store.profiler.fragment
+def note_card(note_data):
+    note_data = st.session_state.changed_cards.get(note_data.id, note_data)
+    if note_data is None:
+        return
+    note_id, heading, _, banner_color, body_color, revision = note_data
+
+    if note_id in st.session_state.editing_note_ids:
+        # Only the note being edited loads its full body. The form is not an
+        # st.form: every change reruns this card and autosaves a draft, which
+        # the form starts from when it is reopened (after a refresh, say).
+        # The saved note, its draft and its history are loaded once, when
+        # editing starts, rather than on every one of those reruns.
+        if f"edit_start_{note_id}" not in st.session_state:
+            full_note = store.get_note(note_id)
+            st.session_state[f"edit_start_{note_id}"] = (
+                Draft(heading, full_note.description if full_note else "", ", ".join(store.get_note_tags(note_id))),
+                store.get_draft(draft_owner, note_id),
+                store.get_revisions(note_id)[1:],
+            )
+        saved, draft, revisions = st.session_state[f"edit_start_{note_id}"]
+        start = draft or saved
+        with st.container(border=True):
+            st.markdown(f'<div style="background-color:{html.escape(banner_color)}; height:10px; margin-bottom: 0.5rem;"></div>', unsafe_allow_html=True)
+            st.subheader("Edit Note")
+            if draft:
+                st.caption("Restored your unsaved changes.")
+            edited_heading = st.text_input("Heading", value=start.heading, key=f"edit_head_{note_id}")
+            edited_tags = st.text_input("Tags", value=start.tags, key=f"edit_tags_{note_id}")
+            with store.profiler.span("st_quill"):
+                edited_description_html = st_quill(value=start.description, html=True, key=f"edit_quill_{note_id}")
+
+            ecol1, ecol2 = st.columns(2)
+            with ecol1:
+                edited_banner_color = st.color_picker("Banner Color", value=banner_color, key=f"edit_banner_color_{note_id}")
+            with ecol2:
+                edited_body_color = st.color_picker("Body Color", value=body_color, key=f"edit_body_color_{note_id}")
+
+            edited = Draft(edited_heading, edited_description_html or "", edited_tags)
+            store.save_draft(draft_owner, note_id, None if edited == saved else edited)
+
+            edit_cols_btns = st.columns(2)
+            with edit_cols_btns[0]:
+                save_button = st.button("Save", key=f"save_note_{note_id}")
+            with edit_cols_btns[1]:
+                cancel_button = st.button("Cancel", key=f"cancel_edit_{note_id}")
+
+            if save_button:
+                if edited_heading:
+                    store.update_note(note_id, edited_heading, edited_description_html, edited_banner_color, edited_body_color,
+                                      tags=edited_tags.split(","))
+                    close_editor(note_id)
+                    st.success("Note updated successfully!")
+                    card_changed(note_id)
+                else:
+                    st.warning("Heading cannot be empty.")
+            if cancel_button:
+                close_editor(note_id)
+                rerun_fragment()
+        note_history(note_id, revisions)
+        return
+
+    # Rendered cards are shared across sessions until the note's revision changes
+    opened = note_id in st.session_state.open_note_ids
+    with store.profiler.span("card html"):
+        card_html = get_card_cache().get_or_build(
+            (note_id, revision, opened),
+            functools.partial(cards.render_card, store, note_data, opened)
+        )
+    st.markdown(card_html, unsafe_allow_html=True)
+
+    button_cols = st.columns(3)
+    with button_cols[0]:
+        if opened:
+            if st.button("📕 Close", key=f"close_note_{note_id}"):
+                st.session_state.open_note_ids.discard(note_id)
+                rerun_fragment()
+        elif st.button("📖 Open", key=f"open_note_{note_id}"):
+            st.session_state.open_note_ids.add(note_id)
+            rerun_fragment()
+    with button_cols[1]:
+        if st.button("✏️ Edit", key=f"edit_note_{note_id}"):
+            st.session_state.editing_note_ids.add(note_id)
+            # Start again from the saved draft, if any
+            st.session_state.pop(f"edit_start_{note_id}", None)
+            rerun_fragment()
+    with button_cols[2]:
+        if st.button("🗑️ Delete", key=f"delete_note_{note_id}"):
+            store.delete_note(note_id)
+            st.success("Note deleted successfully!")
+            card_changed(note_id)
+
+# Sidebar: Folder Management
+store.profiler.phase("sidebar")
+with st.sidebar:
+    search_query = st.text_input("🔍 Search notes", key="search_query").strip()
+    # Tag filter: notes carrying all (or any) of the chosen tags
+    tag_counts = dict(store.get_tags())
+    tag_filter = st.multiselect("🏷️ Filter by tags", sorted(set(tag_counts) | set(st.session_state.get("tag_filter", []))),
+                                key="tag_filter", format_func=lambda name: f"{name} ({tag_counts.get(name, 0)})")
+    match_all_tags = st.toggle("Match all tags", value=True, key="match_all_tags") if len(tag_filter) > 1 else True
+    folder_sidebar()
 
 # Main Area
 st.title("QuickScribe - Your Notes")
 
+folders = store.get_folders()
 current_folder_name = "Home"
 if st.session_state.selected_folder_id is not None:
     selected_folder = next((f for f in folders if f[0] == st.session_state.selected_folder_id), None)
@@ -227,105 +390,30 @@ if st.session_state.selected_folder_id is not None:
 
 st.header(f"Notes in: {current_folder_name}")
 
+store.profiler.phase("new note form")
 _, form_col, _ = st.columns([0.5, 2, 0.5])
 with form_col:
     st.header("Add a New Note")
-    with st.form("new_note_form", clear_on_submit=True):
-        note_heading = st.text_input("Note Heading", max_chars=100, value=st.session_state["new_note_heading_value"], key="new_note_heading")
-        note_description_html = st_quill(
-            placeholder="Enter note description...", html=True,
-            key=f"new_note_quill_{st.session_state.quill_key_suffix}",
-            value=st.session_state["new_note_quill_value"]
-        )
-        col1, col2 = st.columns(2)
-        with col1:
-            new_banner_color = st.color_picker("Banner Color", value='#FFFFE0')
-        with col2:
-            new_body_color = st.color_picker("Body Color", value='#FFFFFF')
-
-        submitted = st.form_submit_button("Add Note")
-        if submitted:
-            if note_heading:
-                add_note(note_heading, note_description_html, st.session_state.selected_folder_id, new_banner_color, new_body_color)
-                st.success(f"Note added to '{current_folder_name}'!")
-                st.session_state["new_note_heading_value"] = ""
-                st.session_state["new_note_quill_value"] = ""
-                st.session_state.editing_note_id = None
-                st.session_state.quill_key_suffix += 1
-                st.rerun()
-            else:
-                st.warning("Note heading cannot be empty.")
+    new_note_form(current_folder_name)
 
 st.divider()
 
-notes = get_notes_by_folder(st.session_state.selected_folder_id)
-
-if not notes:
-    st.info(f"No notes in '{current_folder_name}'. Add one above!")
+store.profiler.phase("listing")
+if search_query:
+    st.header(f"Search results for: {search_query}")
+    listing = ('search', search_query)
+    fetch_page = functools.partial(store.search_notes, search_query)
+    empty_message = f"No notes match '{search_query}'."
+elif tag_filter:
+    joiner = " + " if match_all_tags else " or "
+    st.header(f"Notes tagged: {joiner.join(tag_filter)}")
+    listing = ('tags', tuple(tag_filter), match_all_tags)
+    fetch_page = functools.partial(store.get_notes_by_tags, tag_filter, match_all_tags)
+    empty_message = "No notes carry these tags."
 else:
-    num_columns = 3
-    cols = st.columns(num_columns)
-    for i, note_data in enumerate(notes):
-        note_id, heading, description, banner_color, body_color = note_data
-
-        col_index = i % num_columns
-        with cols[col_index]:
-            if st.session_state.editing_note_id == note_id:
-                with st.form(f"edit_form_{note_id}"):
-                    st.markdown(f'<div style="background-color:{banner_color}; height:10px; margin-bottom: 0.5rem;"></div>', unsafe_allow_html=True)
-                    st.subheader("Edit Note")
-                    edited_heading = st.text_input("Heading", value=heading, key=f"edit_head_{note_id}")
-                    edited_description_html = st_quill(value=description if description else "", html=True, key=f"edit_quill_{note_id}")
-
-                    ecol1, ecol2 = st.columns(2)
-                    with ecol1:
-                        edited_banner_color = st.color_picker("Banner Color", value=banner_color, key=f"edit_banner_color_{note_id}")
-                    with ecol2:
-                        edited_body_color = st.color_picker("Body Color", value=body_color, key=f"edit_body_color_{note_id}")
-
-                    edit_cols_btns = st.columns(2)
-                    with edit_cols_btns[0]:
-                        save_button = st.form_submit_button("Save")
-                    with edit_cols_btns[1]:
-                        cancel_button = st.form_submit_button("Cancel")
-
-                    if save_button:
-                        if edited_heading:
-                            update_note(note_id, edited_heading, edited_description_html, edited_banner_color, edited_body_color)
-                            st.session_state.editing_note_id = None
-                            st.success("Note updated successfully!")
-                            st.rerun()
-                        else:
-                            st.warning("Heading cannot be empty.")
-                    if cancel_button:
-                        st.session_state.editing_note_id = None
-                        st.rerun()
-            else:
-                safe_heading = html.escape(heading)
-                safe_description = description if description else ""
-                safe_description = re.sub(r'<script.*?>.*?</script>', '', safe_description, flags=re.IGNORECASE | re.DOTALL)
-
-                card_html = f"""
-                <div class="note-card-display" style="background-color: {body_color};">
-                    <div class="note-banner-display" style="background-color: {banner_color};"></div>
-                    <div class="note-content-display">
-                        <h3 class="note-heading-display">{safe_heading}</h3>
-                        <div class="note-description-display">{safe_description}</div>
-                    </div>
-                </div>
-                """
-                st.markdown(card_html, unsafe_allow_html=True)
-
-                button_cols = st.columns(2)
-                with button_cols[0]:
-                    if st.button("✏️ Edit", key=f"edit_note_{note_id}"):
-                        st.session_state.editing_note_id = note_id
-                        st.session_state["new_note_heading_value"] = ""
-                        st.session_state["new_note_quill_value"] = ""
-                        st.session_state.quill_key_suffix += 1
-                        st.rerun()
-                with button_cols[1]:
-                    if st.button("🗑️ Delete", key=f"delete_note_{note_id}"):
-                        delete_note(note_id)
-                        st.success("Note deleted successfully!")
-                        st.rerun()
+    listing = ('folder', st.session_state.selected_folder_id)
+    fetch_page = functools.partial(store.get_notes_by_folder, st.session_state.selected_folder_id, include_dated=True)
+    empty_message = f"No notes in '{current_folder_name}'. Add one above!"
+note_grid(listing, fetch_page, empty_message)
+
+show_profile_panel(store.profiler.finish())
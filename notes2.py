@@ -1,188 +1,98 @@
 import streamlit as st
 import sqlite3
+from streamlit.errors import StreamlitAPIException
 from streamlit_quill import st_quill
-import re
-import html  # For escaping heading
+import calendar
 import datetime
+import functools
+import html
+import os
+from quickscribe import Draft, LRUCache, NoteStore, cards
 
-# Database setup
-DB_FILE = "notes.db"
 
-def get_text_color(bg_color):
-    try:
-        hex_color = bg_color.lstrip('#')
-        r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-        luminance = (0.299 * r + 0.587 * g + 0.114 * b) / 255
-        return '#000000' if luminance > 0.5 else '#FFFFFF'
-    except:
-        return '#000000'
-
-
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    # Folders
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS folders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE
-        )
-    """)
-    # Notes with optional note_date
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            heading TEXT NOT NULL,
-            description TEXT,
-            folder_id INTEGER,
-            color TEXT DEFAULT '#FFFFE0',
-            body_color TEXT DEFAULT '#FFFFFF',
-            note_date DATE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE
-        )
-    """)
-    # Add body_color if missing
-    try:
-        cursor.execute("ALTER TABLE notes ADD COLUMN body_color TEXT DEFAULT '#FFFFFF'")
-    except sqlite3.OperationalError:
-        pass
-    # Add note_date if missing
-    try:
-        cursor.execute("ALTER TABLE notes ADD COLUMN note_date DATE")
-    except sqlite3.OperationalError:
-        pass
-    conn.commit()
-    conn.close()
+@st.cache_resource
+def get_store():
+    # One store per server process; its connection pool and read cache are shared by every session
+    return NoteStore("notes.db", blob_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "blobs"),
+                     export_blobs=True)
+
+
+@st.cache_resource
+def get_card_cache():
+    # Rendered card HTML keyed on (note_id, revision, opened). Editing a note bumps
+    # its revision, so stale entries are never looked up again and simply age out.
+    return LRUCache(maxsize=4096)
 
 
 def add_folder(name):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO folders (name) VALUES (?)", (name,))
-        conn.commit()
+        store.add_folder(name)
     except sqlite3.IntegrityError:
         st.error(f"Folder '{name}' already exists.")
-    finally:
-        conn.close()
-
-
-def get_folders():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name FROM folders ORDER BY name")
-    folders = cursor.fetchall()
-    conn.close()
-    return folders
-
-
-def delete_folder(folder_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
-    conn.commit()
-    conn.close()
-
-
-def add_note(heading, description, folder_id=None,
-             banner_color='#FFFFE0', body_color='#FFFFFF', note_date=None):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cleaned = description or ""
-    if cleaned.strip() in ["", "<p><br></p>"]:
-        cleaned = ""
-    if note_date:
-        # Insert with specific note_date
-        cursor.execute(
-            "INSERT INTO notes (heading, description, folder_id, color, body_color, note_date)"
-            " VALUES (?, ?, ?, ?, ?, ?)",
-            (heading, cleaned, folder_id, banner_color, body_color, note_date)
-        )
-    else:
-        # Insert without note_date (NULL)
-        cursor.execute(
-            "INSERT INTO notes (heading, description, folder_id, color, body_color)"
-            " VALUES (?, ?, ?, ?, ?)",
-            (heading, cleaned, folder_id, banner_color, body_color)
-        )
-    conn.commit()
-    conn.close()
-
-
-def get_notes_by_folder(folder_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    if folder_id is None:
-        cursor.execute(
-            "SELECT id, heading, description, color, body_color"
-            " FROM notes WHERE folder_id IS NULL AND note_date IS NULL"
-            " ORDER BY created_at DESC"
-        )
-    else:
-        cursor.execute(
-            "SELECT id, heading, description, color, body_color"
-            " FROM notes WHERE folder_id = ? AND note_date IS NULL"
-            " ORDER BY created_at DESC",
-            (folder_id,)
-        )
-    notes = cursor.fetchall()
-    conn.close()
-    return notes
-
-
-def get_notes_by_date(date_str):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, heading, description, color, body_color"
-        " FROM notes WHERE note_date = ?"
-        " ORDER BY created_at DESC",
-        (date_str,)
-    )
-    notes = cursor.fetchall()
-    conn.close()
-    return notes
-
-
-def update_note(note_id, heading, description, banner_color, body_color):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cleaned = description or ""
-    if cleaned.strip() in ["", "<p><br></p>"]:
-        cleaned = ""
-    cursor.execute(
-        "UPDATE notes SET heading = ?, description = ?, color = ?, body_color = ? WHERE id = ?",
-        (heading, cleaned, banner_color, body_color, note_id)
-    )
-    conn.commit()
-    conn.close()
-
-
-def delete_note(note_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-    conn.commit()
-    conn.close()
-
-# Initialize DB
-init_db()
+
+
+def show_profile_panel(trace):
+    # Admin panel, shown when QUICKSCRIBE_PROFILE is set: where this rerun's time went
+    if trace is None:
+        return
+    with st.sidebar.expander("⏱️ Performance"):
+        totals = trace["totals"]
+        st.caption(f"Rerun {trace['ms']:.1f} ms · {totals['statements']} statements · "
+                   f"{totals['sql_ms']:.1f} ms in SQLite · {totals['rows']} rows · {totals['bytes'] / 1024:.1f} KiB")
+        st.table([{"phase": p["name"], "ms": round(p["ms"], 2)} for p in trace["phases"]])
+        calls = {}
+        for span in trace["spans"]:
+            row = calls.setdefault(span["name"], {"call": span["name"], "n": 0, "ms": 0.0, "sql ms": 0.0, "rows": 0, "bytes": 0})
+            row["n"] += 1
+            row["ms"] += span["ms"]
+            row["sql ms"] += span["sql_ms"]
+            row["rows"] += span["rows"]
+            row["bytes"] += span["bytes"]
+        st.table(sorted(calls.values(), key=lambda row: -row["ms"]))
+        st.subheader("Slow statements")
+        slow = store.profiler.slow_statements()
+        if not slow:
+            st.caption(f"None over {store.profiler.slow_ms:g} ms.")
+        for statement in slow[-10:]:
+            st.code(f"-- {statement['ms']:.1f} ms, {statement['rows']} rows\n{statement['sql']}\n-- " + "\n-- ".join(statement.get("plan", [])), language="sql")
+        st.download_button("Export JSONL", store.profiler.to_jsonl(), file_name="quickscribe-profile.jsonl", mime="application/jsonl")
+
+
+store = get_store()
+store.profiler.start("notes2.py")
+# Drop cached listings that other worker processes have changed
+store.sync()
+# Drafts belong to the browser tab: the token in the URL survives a refresh
+if "draft" not in st.query_params:
+    st.query_params["draft"] = os.urandom(8).hex()
+draft_owner = st.query_params["draft"]
 
 # Session state defaults
 if 'view' not in st.session_state:
     st.session_state.view = 'home'
 for key, default in {
-    'editing_note_id': None,
+    'editing_note_ids': set(),
+    'open_note_ids': set(),
+    'changed_cards': {},  # cards changed since the grid last ran (None once deleted)
     'selected_folder_id': None,
     'show_create_note_form': False,
-    'new_note_heading_value': "",
-    'new_note_quill_value': "",
     'quill_key_suffix': 0,
-    'selected_date': datetime.date.today()
+    'selected_date': datetime.date.today(),
+    'calendar_month': datetime.date.today().replace(day=1),
+    'month_listed': False,  # list the whole calendar month instead of the selected day
+    'notes_listing': None,
+    'notes_pages': 1
 }.items():
     if key not in st.session_state:
         st.session_state[key] = default
+if 'new_note_heading_value' not in st.session_state:
+    # The new note as it was autosaved before a refresh, if any
+    new_draft = store.get_draft(draft_owner, 0)
+    st.session_state.show_create_note_form = new_draft is not None
+    new_draft = new_draft or Draft("", "", "")
+    st.session_state.new_note_heading_value = new_draft.heading
+    st.session_state.new_note_quill_value = new_draft.description
+    st.session_state.new_note_tags_value = new_draft.tags
 
 # Page setup & CSS
 st.set_page_config(page_title="QuickScribe", layout="wide")
@@ -196,53 +106,340 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Sidebar: Home/Date + Folders
-with st.sidebar:
-    st.title("QuickScribe")
-    # Home
-    if st.button("🏠 Home", type="primary" if st.session_state.view=='home' else "secondary"):
-        st.session_state.view = 'home'
-        st.session_state.editing_note_id = None
-        st.session_state.show_create_note_form = False
-        st.rerun()
-    # By Date
-    if st.button("📅 By Date", type="primary" if st.session_state.view=='date' else "secondary"):
-        st.session_state.view = 'date'
-        st.session_state.editing_note_id = None
-        st.session_state.show_create_note_form = False
+# Fragments: the folder list, the note grid and each card rerun on their
+# own, so an edit or delete re-fetches and redraws only the card it touched.
+# Changes that affect the rest of the page still rerun the whole script.
+
+
+def rerun_fragment():
+    # A click normally reruns just its fragment; one that arrives with a full
+    # rerun (e.g. queued behind another interaction) reruns the page instead
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
         st.rerun()
 
-    st.divider()
+
+@st.fragment
+@store.profiler.fragment
+def folder_sidebar():
     st.subheader("Folders")
     with st.form("new_folder_form", clear_on_submit=True):
         nf = st.text_input("New Folder Name")
         if st.form_submit_button("Add Folder") and nf:
             add_folder(nf)
-            st.rerun()
-    folders = get_folders()
-    for fid, fname in folders:
+            rerun_fragment()
+    note_counts = store.get_folder_counts()
+    for fid, fname in store.get_folders():
         c1, c2 = st.columns([0.8, 0.2])
         with c1:
-            if st.button(fname, key=f"sel_{fid}"):
+            if st.button(f"{fname} ({note_counts.get(fid, 0)})", key=f"sel_{fid}"):
                 st.session_state.selected_folder_id = fid
                 st.session_state.view = 'home'
-                st.session_state.editing_note_id = None
+                st.session_state.editing_note_ids.clear()
                 st.session_state.show_create_note_form = False
                 st.rerun()
         with c2:
             if st.button("🗑️", key=f"del_{fid}"):
-                delete_folder(fid)
+                store.delete_folder(fid)
                 if st.session_state.selected_folder_id == fid:
                     st.session_state.selected_folder_id = None
+                    st.rerun()
+                rerun_fragment()
+
+
+@st.fragment
+@store.profiler.fragment
+def note_grid(listing, fetch_page):
+    # The listing is read fresh here, so earlier per-card changes are in it
+    st.session_state.changed_cards = {}
+    # Pagination: start over at one page whenever the listing changes
+    if st.session_state.notes_listing != listing:
+        st.session_state.notes_listing = listing
+        st.session_state.notes_pages = 1
+    notes, next_cursor = [], None
+    for _ in range(st.session_state.notes_pages):
+        page, next_cursor = fetch_page(next_cursor)
+        notes.extend(page)
+        if next_cursor is None:
+            break
+
+    if not notes:
+        st.info("No notes found.")
+        return
+    cols = st.columns(3)
+    for i, note in enumerate(notes):
+        with cols[i % 3]:
+            note_card(note)
+
+    if next_cursor is not None:
+        if st.button("Load more", key="load_more_notes"):
+            st.session_state.notes_pages += 1
+            rerun_fragment()
+
+
+def card_changed(nid):
+    # Redraw just this card from its current row
+    st.session_state.changed_cards[nid] = store.get_card(nid)
+    rerun_fragment()
+
+
+def form_draft(heading, description, tags):
+    # What a note form holds, None while it is empty
+    if heading or tags.strip() or (description or "").strip() not in ["", "<p><br></p>"]:
+        return Draft(heading, description or "", tags)
+    return None
+
+
+def close_editor(nid):
+    store.discard_draft(draft_owner, nid)
+    st.session_state.editing_note_ids.discard(nid)
+    st.session_state.pop(f"edit_start_{nid}", None)
+    st.session_state.pop(f"hist_diff_{nid}", None)
+
+
+@st.fragment
+@store.profiler.fragment
+def new_note_form(folder_id, note_date=None):
+    # Not an st.form: every change reruns just this fragment and autosaves
+    # the new note as a draft, restored if the page is refreshed
+    k = st.session_state.quill_key_suffix
+    with st.container(border=True):
+        nh = st.text_input("Heading", value=st.session_state.new_note_heading_value, key=f"nh_{k}")
+        nt = st.text_input("Tags", placeholder="comma-separated, e.g. work, ideas",
+                           value=st.session_state.new_note_tags_value, key=f"nt_{k}")
+        with store.profiler.span("st_quill"):
+            nd = st_quill(
+                placeholder="Description...",
+                html=True,
+                key=f"quill_{k}",
+                value=st.session_state.new_note_quill_value
+            )
+        col1, col2 = st.columns(2)
+        with col1:
+            bc = st.color_picker("Banner Color", value='#FFFFE0', key=f"nbc_{k}")
+        with col2:
+            boc = st.color_picker("Body Color", value='#FFFFFF', key=f"nboc_{k}")
+        store.save_draft(draft_owner, 0, form_draft(nh, nd, nt))
+        if st.button("Add Note", key=f"add_{k}"):
+            if nh:
+                store.add_note(nh, nd,
+                               folder_id=folder_id,
+                               banner_color=bc,
+                               body_color=boc,
+                               note_date=note_date,
+                               tags=nt.split(","))
+                store.discard_draft(draft_owner, 0)
+                st.success("Note added to date!" if note_date else "Note added to Home/Folder!")
+                st.session_state.show_create_note_form = False
+                st.session_state.new_note_heading_value = ""
+                st.session_state.new_note_quill_value = ""
+                st.session_state.new_note_tags_value = ""
+                st.session_state.editing_note_ids.clear()
+                st.session_state.quill_key_suffix += 1
                 st.rerun()
+            else:
+                st.warning("Heading cannot be empty.")
+
+
+def note_history(nid, revs):
+    # Earlier versions of the note being edited; the diff against the
+    # current one is only built when asked for
+    if not revs:
+        return
+    with st.expander("🕘 History"):
+        r = st.selectbox("Version", revs, key=f"hist_{nid}",
+                         format_func=lambda r: f"{r.saved_at or 'before history'} · {r.heading}")
+        if st.button("Show changes", key=f"hd_{nid}"):
+            st.session_state[f"hist_diff_{nid}"] = (r.revision, store.diff_revisions(nid, r.revision))
+        shown = st.session_state.get(f"hist_diff_{nid}")
+        if shown and shown[0] == r.revision:
+            st.code(shown[1], language="diff")
+        if st.button("Restore this version", key=f"rs_{nid}"):
+            store.restore_revision(nid, r.revision)
+            close_editor(nid)
+            st.success("Restored!")
+            card_changed(nid)
+
+
+@st.fragment
+@store.profiler.fragment
+def note_card(note):
+    note = st.session_state.changed_cards.get(note.id, note)
+    if note is None:
+        return
+    nid, hd, _, banner, body, rev = note
+    if nid in st.session_state.editing_note_ids:
+        # Only the note being edited loads its full body. Not an st.form:
+        # every change reruns this card and autosaves a draft, which the
+        # form starts from when it is reopened. Note, draft and history are
+        # loaded once per edit, not on each of those reruns.
+        if f"edit_start_{nid}" not in st.session_state:
+            full = store.get_note(nid)
+            st.session_state[f"edit_start_{nid}"] = (
+                Draft(hd, full.description if full else "", ", ".join(store.get_note_tags(nid))),
+                store.get_draft(draft_owner, nid),
+                store.get_revisions(nid)[1:],
+            )
+        saved, draft, revs = st.session_state[f"edit_start_{nid}"]
+        start = draft or saved
+        with st.container(border=True):
+            st.markdown(f'<div style="background-color:{html.escape(banner)};height:10px;margin-bottom:0.5rem;"></div>', unsafe_allow_html=True)
+            if draft:
+                st.caption("Restored your unsaved changes.")
+            eh = st.text_input("Heading", value=start.heading, key=f"eh_{nid}")
+            et = st.text_input("Tags", value=start.tags, key=f"et_{nid}")
+            with store.profiler.span("st_quill"):
+                ed = st_quill(value=start.description, html=True, key=f"eq_{nid}")
+            e1, e2 = st.columns(2)
+            with e1:
+                eb = st.color_picker("Banner Color", value=banner, key=f"eb_{nid}")
+            with e2:
+                eboc = st.color_picker("Body Color", value=body, key=f"eboc_{nid}")
+            edited = Draft(eh, ed or "", et)
+            store.save_draft(draft_owner, nid, None if edited == saved else edited)
+            save_col, cancel_col = st.columns(2)
+            with save_col:
+                if st.button("Save", key=f"sv_{nid}"):
+                    store.update_note(nid, eh, ed, eb, eboc, tags=et.split(","))
+                    close_editor(nid)
+                    st.success("Saved!")
+                    card_changed(nid)
+            with cancel_col:
+                if st.button("Cancel", key=f"cn_{nid}"):
+                    close_editor(nid)
+                    rerun_fragment()
+        note_history(nid, revs)
+        return
+
+    # Rendered cards are shared across sessions until the note's revision changes
+    opened = nid in st.session_state.open_note_ids
+    with store.profiler.span("card html"):
+        card = get_card_cache().get_or_build(
+            (nid, rev, opened),
+            functools.partial(cards.render_card, store, note, opened, contrast_text=True)
+        )
+    st.markdown(card, unsafe_allow_html=True)
+    btn_open, btn_edit, btn_del = st.columns(3)
+    with btn_open:
+        if opened:
+            if st.button("📕 Close", key=f"cl_{nid}"):
+                st.session_state.open_note_ids.discard(nid)
+                rerun_fragment()
+        elif st.button("📖 Open", key=f"op_{nid}"):
+            st.session_state.open_note_ids.add(nid)
+            rerun_fragment()
+    with btn_edit:
+        if st.button("✏️ Edit", key=f"ed_{nid}"):
+            st.session_state.editing_note_ids.add(nid)
+            # Start again from the saved draft, if any
+            st.session_state.pop(f"edit_start_{nid}", None)
+            rerun_fragment()
+    with btn_del:
+        if st.button("🗑️ Delete", key=f"dl_{nid}"):
+            store.delete_note(nid)
+            st.success("Deleted!")
+            card_changed(nid)
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=31)).replace(day=1)
+
+
+def show_month(month):
+    st.session_state.calendar_month = month
+    # A listed month follows the calendar, which takes the whole page
+    if st.session_state.month_listed:
+        st.rerun()
+    rerun_fragment()
+
+
+@st.fragment
+@store.profiler.fragment
+def month_calendar():
+    # Paging through months reruns only the calendar: one GROUP BY per month,
+    # no notes loaded. Picking a day reruns the page to list that day.
+    month = st.session_state.calendar_month
+    counts = store.get_day_counts(month.isoformat(), next_month(month).isoformat())
+    c_prev, c_title, c_next = st.columns([0.15, 0.7, 0.15])
+    with c_prev:
+        if st.button("◀", key="cal_prev"):
+            show_month((month - datetime.timedelta(days=1)).replace(day=1))
+    with c_title:
+        st.markdown(f"**{month:%B %Y}** · {sum(counts.values())} notes")
+    with c_next:
+        if st.button("▶", key="cal_next"):
+            show_month(next_month(month))
+    for col, day_name in zip(st.columns(7), calendar.day_abbr):
+        col.caption(day_name)
+    for week in calendar.Calendar().monthdatescalendar(month.year, month.month):
+        for col, day in zip(st.columns(7), week):
+            if day.month != month.month:
+                continue
+            count = counts.get(day.isoformat(), 0)
+            if day == st.session_state.selected_date and not st.session_state.month_listed:
+                kind = "primary"
+            else:
+                kind = "secondary" if count else "tertiary"
+            if col.button(f"{day.day} ({count})" if count else str(day.day), key=f"cal_{day}", type=kind,
+                          use_container_width=True):
+                st.session_state.selected_date = day
+                st.session_state.month_listed = False
+                st.session_state.editing_note_ids.clear()
+                st.rerun()
+    if st.button("All notes this month", key="cal_month", disabled=not counts):
+        st.session_state.month_listed = True
+        st.session_state.editing_note_ids.clear()
+        st.rerun()
+
+
+# Sidebar: Home/Date + Folders
+store.profiler.phase("sidebar")
+with st.sidebar:
+    st.title("QuickScribe")
+    # Search covers folder notes and dated notes alike
+    search_query = st.text_input("🔍 Search notes", key="search_query").strip()
+    # Tag filter: notes carrying all (or any) of the chosen tags, in every view
+    tag_counts = dict(store.get_tags())
+    tag_filter = st.multiselect("🏷️ Filter by tags", sorted(set(tag_counts) | set(st.session_state.get("tag_filter", []))),
+                                key="tag_filter", format_func=lambda name: f"{name} ({tag_counts.get(name, 0)})")
+    match_all_tags = st.toggle("Match all tags", value=True, key="match_all_tags") if len(tag_filter) > 1 else True
+    # Home
+    if st.button("🏠 Home", type="primary" if st.session_state.view=='home' else "secondary"):
+        st.session_state.view = 'home'
+        st.session_state.editing_note_ids.clear()
+        st.session_state.show_create_note_form = False
+        st.rerun()
+    # By Date
+    if st.button("📅 By Date", type="primary" if st.session_state.view=='date' else "secondary"):
+        st.session_state.view = 'date'
+        st.session_state.editing_note_ids.clear()
+        st.session_state.show_create_note_form = False
+        st.rerun()
+
+    st.divider()
+    folder_sidebar()
 
 # Main area
+store.profiler.phase("main area")
 st.title("QuickScribe - Your Notes")
 
-if st.session_state.view == 'home':
+if search_query:
+    st.header(f"Search results for: {search_query}")
+    st.divider()
+    listing = ('search', search_query)
+    fetch_page = functools.partial(store.search_notes, search_query)
+
+elif tag_filter:
+    st.header(f"Notes tagged: {(' + ' if match_all_tags else ' or ').join(tag_filter)}")
+    st.divider()
+    listing = ('tags', tuple(tag_filter), match_all_tags)
+    fetch_page = functools.partial(store.get_notes_by_tags, tag_filter, match_all_tags)
+
+elif st.session_state.view == 'home':
     current = None
     if st.session_state.selected_folder_id:
-        fl = [f for f in folders if f[0] == st.session_state.selected_folder_id]
+        fl = [f for f in store.get_folders() if f[0] == st.session_state.selected_folder_id]
         current = fl[0][1] if fl else None
     st.header(f"Notes in: {current or 'Home'}")
 
@@ -257,44 +454,18 @@ if st.session_state.view == 'home':
         _, fc, _ = st.columns([0.5, 2, 0.5])
         with fc:
             st.subheader("Add a New Note")
-            with st.form("new_note_form", clear_on_submit=True):
-                nh = st.text_input("Heading", value=st.session_state.new_note_heading_value)
-                nd = st_quill(
-                    placeholder="Description...",
-                    html=True,
-                    key=f"quill_{st.session_state.quill_key_suffix}",
-                    value=st.session_state.new_note_quill_value
-                )
-                col1, col2 = st.columns(2)
-                with col1:
-                    bc = st.color_picker("Banner Color", value='#FFFFE0')
-                with col2:
-                    boc = st.color_picker("Body Color", value='#FFFFFF')
-                if st.form_submit_button("Add Note"):
-                    if nh:
-                        add_note(nh, nd,
-                                 folder_id=st.session_state.selected_folder_id,
-                                 banner_color=bc,
-                                 body_color=boc)
-                        st.success("Note added to Home/Folder!")
-                        st.session_state.show_create_note_form = False
-                        st.session_state.new_note_heading_value = ""
-                        st.session_state.new_note_quill_value = ""
-                        st.session_state.editing_note_id = None
-                        st.session_state.quill_key_suffix += 1
-                        st.rerun()
-                    else:
-                        st.warning("Heading cannot be empty.")
+            new_note_form(st.session_state.selected_folder_id)
 
     st.divider()
-    notes = get_notes_by_folder(st.session_state.selected_folder_id)
+    listing = ('folder', st.session_state.selected_folder_id)
+    fetch_page = functools.partial(store.get_notes_by_folder, st.session_state.selected_folder_id)
 
 elif st.session_state.view == 'date':
-    sd = st.date_input("Select Date", value=st.session_state.selected_date)
-    if sd != st.session_state.selected_date:
-        st.session_state.selected_date = sd
-        st.rerun()
-    st.header(f"Notes for: {st.session_state.selected_date}")
+    month_calendar()
+    if st.session_state.month_listed:
+        st.header(f"Notes in: {st.session_state.calendar_month:%B %Y}")
+    else:
+        st.header(f"Notes for: {st.session_state.selected_date}")
 
     # Create Note in date view
     if not st.session_state.show_create_note_form:
@@ -307,89 +478,18 @@ elif st.session_state.view == 'date':
         _, fc, _ = st.columns([0.5, 2, 0.5])
         with fc:
             st.subheader("Add a New Note")
-            with st.form("new_note_form_date", clear_on_submit=True):
-                nh = st.text_input("Heading", value=st.session_state.new_note_heading_value)
-                nd = st_quill(
-                    placeholder="Description...",
-                    html=True,
-                    key=f"quill_date_{st.session_state.quill_key_suffix}",
-                    value=st.session_state.new_note_quill_value
-                )
-                c1, c2 = st.columns(2)
-                with c1:
-                    bc = st.color_picker("Banner Color", value='#FFFFE0')
-                with c2:
-                    boc = st.color_picker("Body Color", value='#FFFFFF')
-                if st.form_submit_button("Add Note"):
-                    if nh:
-                        add_note(nh, nd,
-                                 folder_id=None,
-                                 banner_color=bc,
-                                 body_color=boc,
-                                 note_date=st.session_state.selected_date.isoformat())
-                        st.success("Note added to date!")
-                        st.session_state.show_create_note_form = False
-                        st.session_state.new_note_heading_value = ""
-                        st.session_state.new_note_quill_value = ""
-                        st.session_state.editing_note_id = None
-                        st.session_state.quill_key_suffix += 1
-                        st.rerun()
-                    else:
-                        st.warning("Heading cannot be empty.")
+            new_note_form(None, st.session_state.selected_date.isoformat())
 
     st.divider()
-    notes = get_notes_by_date(st.session_state.selected_date.isoformat())
+    if st.session_state.month_listed:
+        month = st.session_state.calendar_month
+        listing = ('month', month)
+        fetch_page = functools.partial(store.get_notes_in_range, month.isoformat(), next_month(month).isoformat())
+    else:
+        listing = ('date', st.session_state.selected_date)
+        fetch_page = functools.partial(store.get_notes_by_date, st.session_state.selected_date.isoformat())
 
-# Display notes list
-if not notes:
-    st.info("No notes found.")
-else:
-    cols = st.columns(3)
-    for i, (nid, hd, desc, banner, body) in enumerate(notes):
-        col = cols[i % 3]
-        with col:
-            if st.session_state.editing_note_id == nid:
-                with st.form(f"edit_{nid}"):
-                    st.markdown(f'<div style="background-color:{banner};height:10px;margin-bottom:0.5rem;"></div>', unsafe_allow_html=True)
-                    eh = st.text_input("Heading", value=hd)
-                    ed = st_quill(value=desc or "", html=True)
-                    e1, e2 = st.columns(2)
-                    with e1:
-                        eb = st.color_picker("Banner Color", value=banner)
-                    with e2:
-                        eboc = st.color_picker("Body Color", value=body)
-                    save_col, cancel_col = st.columns(2)
-                    with save_col:
-                        if st.form_submit_button("Save"):
-                            update_note(nid, eh, ed, eb, eboc)
-                            st.session_state.editing_note_id = None
-                            st.success("Saved!")
-                            st.rerun()
-                    with cancel_col:
-                        if st.form_submit_button("Cancel"):
-                            st.session_state.editing_note_id = None
-                            st.rerun()
-            else:
-                safe_h = html.escape(hd)
-                safe_d = re.sub(r'<script.*?>.*?</script>', '', desc or "",
-                                flags=re.IGNORECASE|re.DOTALL)
-                card = f"""
-                <div class="note-card-display" style="background-color:{body};">
-                  <div class="note-banner-display" style="background-color:{banner};"></div>
-                  <div class="note-content-display" style="color:{get_text_color(body)};">
-                    <h3 class="note-heading-display">{safe_h}</h3>
-                    <div class="note-description-display">{safe_d}</div>
-                  </div>
-                </div>
-                """
-                st.markdown(card, unsafe_allow_html=True)
-                btn_edit, btn_del = st.columns(2)
-                with btn_edit:
-                    if st.button("✏️ Edit", key=f"ed_{nid}"):
-                        st.session_state.editing_note_id = nid
-                        st.rerun()
-                with btn_del:
-                    if st.button("🗑️ Delete", key=f"dl_{nid}"):
-                        delete_note(nid)
-                        st.success("Deleted!")
-                        st.rerun()
+store.profiler.phase("listing")
+note_grid(listing, fetch_page)
+
+show_profile_panel(store.profiler.finish())
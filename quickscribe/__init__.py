@@ -0,0 +1,8 @@
+# Headless storage for QuickScribe notes. See store.py.
+
+from .backups import BackupError
+from .cache import LRUCache
+from .store import Cursor, Draft, Note, NoteCard, NoteStore, Page, Revision, prepare_body
+from .writer import WriterBusy
+
+__all__ = ["BackupError", "Cursor", "Draft", "LRUCache", "Note", "NoteCard", "NoteStore", "Page", "Revision", "WriterBusy", "prepare_body"]
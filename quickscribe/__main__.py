@@ -0,0 +1,166 @@
+import argparse
+import os
+import sys
+import tempfile
+
+from . import backups, blobs, bulk, compression, db, history, orphans, queries, query_plans, sanitize
+from .store import NoteStore
+
+# Maintenance commands:
+#
+#   python -m quickscribe [--db notes.db] sanitize          # re-sanitize bodies from older sanitizer versions
+#   python -m quickscribe [--db notes.db] migrate-images    # move embedded images into the blob store
+#   python -m quickscribe [--db notes.db] gc                # delete images no note, revision or draft uses
+#   python -m quickscribe [--db notes.db] compression --stats | --apply
+#   python -m quickscribe [--db notes.db] export notes.jsonl.gz
+#   python -m quickscribe [--db notes.db] import notes.jsonl.gz [--workers 4]
+#   python -m quickscribe [--db notes.db] check-plans       # without --db: a fresh database
+#   python -m quickscribe [--db notes.db] orphans [--purge | --reassign]
+#   python -m quickscribe [--db notes.db] history --stats | --prune
+#   python -m quickscribe [--db notes.db] backup [DIR] [--keep 7]   # DIR defaults to backups/ next to the database
+#   python -m quickscribe [--db notes.db] restore BACKUP
+
+DB_FILE = "notes.db"
+
+
+def _progress(verb, stream=sys.stdout, noun="notes"):
+    return lambda done: print(f"\r{verb} {done} {noun}", end="", file=stream, flush=True)
+
+
+def check_plans(db_file):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = NoteStore(db_file or os.path.join(tmp, "plans.db"), blob_dir=os.path.join(tmp, "blobs"))
+        with store.pool.connection() as conn:
+            failures = query_plans.check(conn)
+        store.close()
+    for name, problems in failures.items():
+        print(f"FAIL {name}: {'; '.join(problems)}")
+    if not failures:
+        print(f"OK: {len(queries.LISTING_QUERIES)} paginated listing queries, {len(queries.TAG_QUERIES)} tag filters "
+              f"and {len(queries.AGGREGATE_QUERIES)} aggregates use their indexes")
+    return 1 if failures else 0
+
+
+def backup_command(args):
+    db_file = args.db or DB_FILE
+    pool = db.ConnectionPool(db_file)
+    try:
+        if args.command == "backup":
+            directory = args.directory or os.path.join(os.path.dirname(os.path.abspath(db_file)), "backups")
+            report = backups.backup(pool, directory, args.keep, args.pages, args.pause_ms / 1000,
+                                    progress=_progress("copied", noun="pages"))
+            print("\r", end="")
+            backups.print_report(report)
+        else:
+            saved = backups.restore(pool, args.path, progress=_progress("restored", noun="pages"))
+            print(f"\rrestored {db_file} from {args.path}")
+            if saved:
+                print(f"the previous database was saved as {saved}")
+            print("restart the app (every worker process) to drop caches of the old database")
+    except backups.BackupError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        pool.close_all()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m quickscribe", description="QuickScribe database maintenance.")
+    parser.add_argument("--db", help=f"database file (default: {DB_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("sanitize", help="reprocess rows from older sanitizer versions")
+    command.add_argument("--batch-size", type=int, default=500)
+    command = commands.add_parser("migrate-images", help="move embedded note images into the blob store")
+    command.add_argument("--batch-size", type=int, default=100)
+    commands.add_parser("gc", help="delete stored images no note, revision or draft refers to")
+    command = commands.add_parser("compression", help="inspect or apply note body compression")
+    command.add_argument("--stats", action="store_true", help="report compression ratio and decode cost")
+    command.add_argument("--apply", action="store_true",
+                         help="re-encode rows under QUICKSCRIBE_COMPRESSION / QUICKSCRIBE_COMPRESS_MIN_BYTES")
+    command.add_argument("--batch-size", type=int, default=500)
+    command = commands.add_parser("export", help="write folders, images and notes as JSONL")
+    command.add_argument("path", help="JSONL file (.gz for gzip, - for stdout)")
+    command = commands.add_parser("import", help="read folders, images and notes from JSONL")
+    command.add_argument("path", help="JSONL file (.gz for gzip, - for stdin)")
+    command.add_argument("--batch-size", type=int, default=bulk.BATCH_SIZE)
+    command.add_argument("--workers", type=int, default=1, help="processes preparing note bodies")
+    commands.add_parser("check-plans", help="verify every listing query uses its covering index")
+    command = commands.add_parser("orphans", help="find notes left behind by deleted folders")
+    action = command.add_mutually_exclusive_group()
+    action.add_argument("--purge", action="store_true", help="delete them")
+    action.add_argument("--reassign", action="store_true", help="move them to Home")
+    command.add_argument("--batch-size", type=int, default=500)
+    command = commands.add_parser("history", help="inspect or prune note revision history")
+    command.add_argument("--stats", action="store_true", help="report revisions and their storage")
+    command.add_argument("--prune", action="store_true",
+                         help=f"thin revisions older than {history.KEEP_DAYS} days to one per day")
+    command.add_argument("--batch-size", type=int, default=200)
+    command = commands.add_parser("backup", help="back up the database while the app keeps running")
+    command.add_argument("directory", nargs="?", help="where backups go (default: backups/ next to the database)")
+    command.add_argument("--keep", type=int, default=backups.KEEP, help="backups to keep, 0 for all")
+    command.add_argument("--pages", type=int, default=backups.PAGES_PER_STEP, help="pages copied per step")
+    command.add_argument("--pause-ms", type=float, default=backups.PAUSE * 1000, help="pause between steps")
+    command = commands.add_parser("restore", help="replace the database with a backup")
+    command.add_argument("path", help="backup file")
+    args = parser.parse_args(argv)
+
+    if args.command == "check-plans":
+        return check_plans(args.db)
+    # Backups work on the file as it is, without migrating it first
+    if args.command in ("backup", "restore"):
+        return backup_command(args)
+    if args.command == "compression" and not (args.stats or args.apply):
+        parser.error("compression needs --stats and/or --apply")
+    if args.command == "history" and not (args.stats or args.prune):
+        parser.error("history needs --stats and/or --prune")
+
+    store = NoteStore(args.db or DB_FILE)
+    try:
+        if args.command == "sanitize":
+            total = sanitize.backfill(store, args.batch_size, progress=_progress("sanitized"))
+            print(f"\rsanitized {total} notes")
+        elif args.command == "migrate-images":
+            total = blobs.migrate_existing(store, args.batch_size, progress=_progress("converted"))
+            print(f"\rconverted {total} notes")
+        elif args.command == "gc":
+            total, size = blobs.collect_garbage(store, progress=_progress("scanned", noun="bodies"))
+            print(f"\rdeleted {total} unused images ({size / 1024:.1f} KiB)")
+        elif args.command == "compression":
+            if args.apply:
+                total = compression.apply(store, args.batch_size, progress=_progress("re-encoded"))
+                print(f"\rre-encoded {total} notes")
+            if args.stats:
+                compression.print_stats(store)
+        elif args.command == "export":
+            # Progress goes to stderr so exporting to stdout stays clean
+            total = bulk.export_jsonl(store, args.path, progress=_progress("exported", sys.stderr))
+            print(f"\rexported {total} notes", file=sys.stderr)
+        elif args.command == "import":
+            total = bulk.import_jsonl(store, args.path, args.batch_size, args.workers,
+                                      progress=_progress("imported", sys.stderr))
+            print(f"\rimported {total} notes", file=sys.stderr)
+        elif args.command == "orphans":
+            with store.pool.connection() as conn:
+                found = orphans.find(conn)
+            for folder_id, count in sorted(found.items()):
+                print(f"folder {folder_id} (deleted): {count} notes")
+            print(f"{sum(found.values())} orphaned notes")
+            if found and (args.purge or args.reassign):
+                verb = "purged" if args.purge else "reassigned"
+                total = orphans.fix(store, args.purge, args.batch_size, progress=_progress(verb))
+                print(f"\r{verb} {total} notes" + ("" if args.purge else " to Home"))
+        elif args.command == "history":
+            if args.prune:
+                total = history.prune_all(store, args.batch_size, progress=_progress("dropped", noun="revisions"))
+                print(f"\rdropped {total} revisions")
+            if args.stats:
+                history.print_stats(store)
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
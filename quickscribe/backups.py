@@ -0,0 +1,205 @@
+import datetime
+import glob
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+# Online backups with SQLite's backup API, copying pages_per_step pages at
+# a time from a connection of its own and pausing between steps, so the
+# copy does not take all of the disk's bandwidth from the app. The whole
+# copy runs in one read transaction: with WAL a reader never blocks writers,
+# and every step copies from the same snapshot. Without it, each step would
+# start its own, and any write committed in between would make SQLite
+# restart the copy from the first page. A busy app would rarely finish one.
+# Checkpoints cannot pass the snapshot while it is held, so the WAL grows by
+# the writes made during the backup.
+#
+# A backup is written to a temporary file, switched to a rollback journal
+# so it is a single self-contained file, checked with PRAGMA
+# integrity_check and only then renamed into place. The oldest backups
+# beyond keep are deleted. restore() copies a backup back the same way,
+# after saving the current database next to the backup.
+#
+#   python -m quickscribe backup [DIR] [--keep 7]
+#   python -m quickscribe restore BACKUP
+#
+# NoteStore(backup_dir=...) or QUICKSCRIBE_BACKUP_DIR also backs up from a
+# background thread every QUICKSCRIBE_BACKUP_INTERVAL seconds (see Scheduler).
+
+PAGES_PER_STEP = 1024  # 4 MiB at the default page size
+PAUSE = 0.005  # seconds between steps
+KEEP = 7
+INTERVAL = 24 * 3600
+RETRY = 300  # seconds before a scheduled backup that failed is tried again
+
+
+class BackupError(RuntimeError):
+    pass
+
+
+class Report(NamedTuple):
+    path: str
+    pages: int
+    page_size: int
+    seconds: float  # the whole backup, integrity check included
+    copying: float  # time spent in backup steps
+    paused: float  # time between steps, leaving the disk to the app
+    steps: int
+    longest_step: float
+    removed: int  # old backups deleted by rotation
+
+
+def _copy(source, target, pages, pause, progress):
+    stats = {"steps": 0, "copying": 0.0, "paused": 0.0, "longest_step": 0.0, "pages": 0}
+    last = time.perf_counter()
+
+    def step_done(status, remaining, total):
+        nonlocal last
+        now = time.perf_counter()
+        stats["steps"] += 1
+        stats["copying"] += now - last
+        stats["longest_step"] = max(stats["longest_step"], now - last)
+        stats["pages"] = total
+        if progress:
+            progress(total - remaining)
+        if remaining and pause:
+            time.sleep(pause)
+            stats["paused"] += time.perf_counter() - now
+        last = time.perf_counter()
+
+    # BEGIN is deferred: the read transaction starts at the first read
+    source.execute("BEGIN")
+    source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    try:
+        source.backup(target, pages=pages, progress=step_done)
+    finally:
+        source.rollback()
+    return stats
+
+
+def _integrity(conn):
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        return str(e)
+    return None if problems == ["ok"] else "; ".join(problems[:5])
+
+
+def rotate(directory, stem, keep):
+    # Deletes all but the newest keep scheduled/manual backups; returns how
+    # many. Backups saved by restore() are named differently and kept.
+    found = sorted(glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(stem)}-[0-9]*.db")))
+    old = found[:-keep] if keep else []
+    for path in old:
+        os.remove(path)
+    return len(old)
+
+
+def backup(pool, directory, keep=KEEP, pages_per_step=PAGES_PER_STEP, pause=PAUSE, label=None, progress=None):
+    # Backs up the pool's database into directory as <name>-<time>.db and
+    # returns a Report; raises BackupError if the copy fails its integrity
+    # check. progress(pages copied) runs after every step.
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(pool.db_file))[0]
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"{stem}-{label}-{stamp}.db" if label else f"{stem}-{stamp}.db")
+    partial = path + ".partial"
+    source = pool.open_connection()
+    target = sqlite3.connect(partial)
+    try:
+        page_size = source.execute("PRAGMA page_size").fetchone()[0]
+        stats = _copy(source, target, pages_per_step, pause, progress)
+        target.execute("PRAGMA journal_mode=DELETE")
+        problem = _integrity(target)
+    finally:
+        source.close()
+        target.close()
+    if problem:
+        os.remove(partial)
+        raise BackupError(f"backup of {pool.db_file} failed its integrity check: {problem}")
+    os.replace(partial, path)
+    removed = rotate(directory, stem, keep) if not label else 0
+    return Report(path=path, page_size=page_size, seconds=time.perf_counter() - start, removed=removed, **stats)
+
+
+def restore(pool, backup_path, progress=None):
+    # Replaces the pool's database with the backup's contents; returns the
+    # path the current database was saved to first (None if it was empty).
+    # Other processes should be stopped: their caches predate the restore.
+    if not os.path.isfile(backup_path):
+        raise BackupError(f"{backup_path} does not exist")
+    source = sqlite3.connect(pathlib.Path(backup_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        problem = _integrity(source)
+        if problem:
+            raise BackupError(f"{backup_path} failed its integrity check: {problem}")
+        saved = None
+        with pool.connection() as conn:
+            has_tables = conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+        if has_tables:
+            saved = backup(pool, os.path.dirname(os.path.abspath(backup_path)), label="pre-restore").path
+        target = pool.open_connection()
+        try:
+            source.backup(target, progress=progress and (lambda status, remaining, total: progress(total - remaining)))
+        finally:
+            target.close()
+    finally:
+        source.close()
+    pool.close_all()
+    return saved
+
+
+def print_report(report, stream=None):
+    size = report.pages * report.page_size
+    rate = size / report.copying / 2 ** 20 if report.copying else 0
+    print(f"backed up {size / 2 ** 20:.1f} MiB ({report.pages} pages) to {report.path} in {report.seconds:.2f} s",
+          file=stream)
+    print(f"copying {report.copying:.2f} s ({rate:.1f} MiB/s) in {report.steps} steps, "
+          f"longest step {report.longest_step * 1000:.1f} ms; paused {report.paused * 1000:.0f} ms between steps",
+          file=stream)
+    print("integrity check ok" + (f"; removed {report.removed} old backups" if report.removed else ""), file=stream)
+
+
+class Scheduler:
+    # Backs up every interval seconds on a daemon thread. The interval is
+    # counted from the newest backup in the directory, so restarting the app
+    # (or several processes sharing the directory) does not back up more
+    # often than that.
+    def __init__(self, pool, directory, interval=INTERVAL, keep=KEEP):
+        self._pool = pool
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.last = None  # Report of the last backup this process made
+        self.error = None  # the last failure, cleared by the next success
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="quickscribe-backups", daemon=True)
+        self._thread.start()
+
+    def _age(self):
+        stem = os.path.splitext(os.path.basename(self._pool.db_file))[0]
+        found = glob.glob(os.path.join(glob.escape(self.directory), f"{glob.escape(stem)}-[0-9]*.db"))
+        return time.time() - max(map(os.path.getmtime, found)) if found else float("inf")
+
+    def _run(self):
+        while True:
+            wait = self.interval - self._age()
+            if wait <= 0:
+                try:
+                    self.last = backup(self._pool, self.directory, self.keep)
+                    self.error = None
+                    wait = self.interval
+                except Exception as e:
+                    self.error = e
+                    wait = min(self.interval, RETRY)
+            if self._stop.wait(wait):
+                return
+
+    def close(self):
+        # Waits for a backup in progress to finish
+        self._stop.set()
+        self._thread.join()
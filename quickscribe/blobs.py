@@ -0,0 +1,178 @@
+import base64
+import binascii
+import hashlib
+import itertools
+import os
+import re
+
+from . import compression, history
+
+# Content-addressed store for images pasted into notes. st_quill embeds them
+# as data:image/...;base64 URIs inside the description; on write they are
+# moved into the blobs table (keyed by SHA-256, so a pasted image is stored
+# once however many notes use it) and the <img> points at a static file
+# instead. Streamlit serves ./static at app/static/ (see .streamlit/config.toml),
+# so a NoteStore writes its blob files to static/blobs next to the apps, and the
+# browser fetches images only when a card with them is shown.
+#
+# Existing notes are converted in batches with:
+#
+#   python -m quickscribe migrate-images
+#
+# Blobs no note body, revision or draft refers to any more are deleted,
+# with their static files, by:
+#
+#   python -m quickscribe gc
+
+URL_PREFIX = "app/static/blobs/"
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/gif": "gif", "image/webp": "webp"}
+
+_DATA_IMAGE = re.compile(
+    r'src="data:(image/(?:png|jpe?g|gif|webp));base64,([A-Za-z0-9+/=\s]+)"', re.IGNORECASE
+)
+_REFERENCE = re.compile(re.escape(URL_PREFIX) + r"([0-9a-f]{64})\.")
+
+
+def blob_filename(digest, mime):
+    return f"{digest}.{EXTENSIONS[mime]}"
+
+
+def extract_images(description):
+    # Returns (description with image references, {digest: (mime, data)}).
+    # Runs on sanitized HTML, where every attribute is double-quoted.
+    found = {}
+
+    def replace(match):
+        mime = match.group(1).lower().replace("image/jpg", "image/jpeg")
+        try:
+            data = base64.b64decode(match.group(2))
+        except binascii.Error:
+            return match.group(0)
+        digest = hashlib.sha256(data).hexdigest()
+        found[digest] = (mime, data)
+        return f'src="{URL_PREFIX}{blob_filename(digest, mime)}" loading="lazy"'
+
+    if not description or "data:image/" not in description:
+        return description, found
+    return _DATA_IMAGE.sub(replace, description), found
+
+
+def insert(conn, images):
+    # Inside the caller's write transaction
+    conn.executemany(
+        "INSERT OR IGNORE INTO blobs (hash, mime, size, data) VALUES (?, ?, ?, ?)",
+        [(digest, mime, len(data), data) for digest, (mime, data) in images.items()]
+    )
+
+
+def _write_file(blob_dir, digest, mime, data):
+    path = os.path.join(blob_dir, blob_filename(digest, mime))
+    if os.path.exists(path):
+        return
+    os.makedirs(blob_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_files(blob_dir, images):
+    # After commit: make the blobs servable
+    for digest, (mime, data) in images.items():
+        _write_file(blob_dir, digest, mime, data)
+
+
+def export_missing(pool, blob_dir):
+    # The database is the source of truth; the static directory is a cache
+    # that may be empty on a fresh worker. NoteStore runs this when created.
+    existing = set(os.listdir(blob_dir)) if os.path.isdir(blob_dir) else set()
+    with pool.connection() as conn:
+        missing = [
+            (digest, mime) for digest, mime in conn.execute("SELECT hash, mime FROM blobs")
+            if blob_filename(digest, mime) not in existing
+        ]
+        for digest, mime in missing:
+            data = conn.execute("SELECT data FROM blobs WHERE hash = ?", (digest,)).fetchone()[0]
+            _write_file(blob_dir, digest, mime, data)
+
+
+def migrate_existing(store, batch_size=100, progress=None):
+    # Streams over notes that still embed images, one transaction per batch.
+    last_id = 0
+    converted = 0
+    while True:
+        with store.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, description, description_codec FROM notes"
+                " WHERE id > ? AND (description_codec != '' OR instr(description, 'data:image/') > 0)"
+                " ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+        if not rows:
+            return converted
+        updates = []
+        images = {}
+        for note_id, value, codec in rows:
+            new_description, found = extract_images(compression.decode(value, codec))
+            if found:
+                updates.append(store.encode_body(new_description) + (note_id,))
+                images.update(found)
+        with store.pool.transaction() as conn:
+            insert(conn, images)
+            conn.executemany("UPDATE notes SET description = ?, description_codec = ? WHERE id = ?", updates)
+        write_files(store.blob_dir, images)
+        last_id = rows[-1][0]
+        converted += len(updates)
+        if progress:
+            progress(converted)
+
+
+def _references(bodies, progress=None):
+    referenced = set()
+    for scanned, body in enumerate(bodies, 1):
+        referenced.update(_REFERENCE.findall(body or ""))
+        if progress and scanned % 1000 == 0:
+            progress(scanned)
+    return referenced
+
+
+def collect_garbage(store, progress=None):
+    # Deletes blobs that no note body, revision or draft refers to and
+    # unlinks their files; returns (blobs deleted, bytes freed).
+    #
+    # The full scan runs in a read transaction, so writers carry on. A short
+    # write transaction then rescans only what changed since: notes with a
+    # new id or revision (edits add revisions too) and the drafts. Run it
+    # apart from migrate-images, whose rewrites keep the revision.
+    with store.pool.connection() as conn:
+        # BEGIN is deferred: the snapshot starts at the first read
+        conn.execute("BEGIN")
+        try:
+            revisions = dict(conn.execute("SELECT id, revision FROM notes"))
+            bodies = (compression.decode(value, codec) for value, codec in
+                      conn.execute("SELECT description, description_codec FROM notes"))
+            drafts = (row[0] for row in conn.execute("SELECT description FROM drafts"))
+            referenced = _references(itertools.chain(bodies, history.all_bodies(conn), drafts), progress)
+            candidates = {digest: (mime, size)
+                          for digest, mime, size in conn.execute("SELECT hash, mime, size FROM blobs")
+                          if digest not in referenced}
+        finally:
+            conn.rollback()
+    if not candidates:
+        return 0, 0
+    with store.pool.transaction() as conn:
+        changed = [note_id for note_id, revision in conn.execute("SELECT id, revision FROM notes")
+                   if revisions.get(note_id) != revision]
+        bodies = (compression.decode(*conn.execute("SELECT description, description_codec FROM notes WHERE id = ?",
+                                                    (note_id,)).fetchone()) for note_id in changed)
+        revision_bodies = itertools.chain.from_iterable(history.all_bodies(conn, note_id) for note_id in changed)
+        drafts = (row[0] for row in conn.execute("SELECT description FROM drafts"))
+        referenced = _references(itertools.chain(bodies, revision_bodies, drafts))
+        unused = [(digest, mime, size) for digest, (mime, size) in candidates.items() if digest not in referenced]
+        conn.executemany("DELETE FROM blobs WHERE hash = ?", [(digest,) for digest, _, _ in unused])
+    for digest, mime, _ in unused:
+        try:
+            os.remove(os.path.join(store.blob_dir, blob_filename(digest, mime)))
+        except FileNotFoundError:
+            pass
+    return len(unused), sum(size for _, _, size in unused)
@@ -0,0 +1,208 @@
+import base64
+import contextlib
+import functools
+import gzip
+import hashlib
+import itertools
+import json
+import multiprocessing
+import sys
+
+from . import blobs, compression, sanitize, tagging
+from .store import prepare_body
+
+# Bulk import/export of folders, notes and images as JSONL, one record per
+# line (gzip when the file name ends in .gz, '-' for stdin/stdout):
+#
+#   {"type": "folder", "name": "Work"}
+#   {"type": "blob", "hash": "...", "mime": "image/png", "data": "<base64>"}
+#   {"type": "note", "heading": "...", "description": "<p>...</p>", "folder": "Work",
+#    "color": "#FFFFE0", "body_color": "#FFFFFF", "note_date": null, "created_at": "...",
+#    "tags": ["work", "urgent"]}
+#
+# Both directions stream, so memory does not grow with the number of notes.
+# Imported bodies go through the same sanitize/preview pipeline as the apps.
+#
+#   python -m quickscribe export notes.jsonl.gz
+#   python -m quickscribe import notes.jsonl.gz [--workers 4]
+
+BATCH_SIZE = 5000
+EXPORT_BATCH_SIZE = 1000
+
+_INSERT_NOTE = (
+    "INSERT INTO notes (heading, description, description_codec, folder_id, color, body_color, preview,"
+    " search_text, sanitizer_version, note_date, created_at)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))"
+)
+
+
+def _open(path, mode):
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin if mode == "r" else sys.stdout)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _dump(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _keyset(pool, sql, start, batch_size):
+    # Yields rows of a query ordered by its first column, one batch at a time
+    last = start
+    while True:
+        with pool.connection() as conn:
+            rows = conn.execute(sql, (last, batch_size)).fetchall()
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1][0]
+
+
+def export_jsonl(store, path, progress=None):
+    exported = 0
+    with _open(path, "w") as out:
+        with store.pool.connection() as conn:
+            folder_names = dict(conn.execute("SELECT id, name FROM folders"))
+        for name in sorted(folder_names.values()):
+            out.write(_dump({"type": "folder", "name": name}))
+        for digest, mime, data in _keyset(
+            store.pool,
+            "SELECT hash, mime, data FROM blobs WHERE hash > ? ORDER BY hash LIMIT ?", "", 100
+        ):
+            out.write(_dump({"type": "blob", "hash": digest, "mime": mime,
+                             "data": base64.b64encode(data).decode("ascii")}))
+        for row in _keyset(
+            store.pool,
+            "SELECT id, heading, description, description_codec, folder_id, color, body_color, note_date,"
+            " created_at, (SELECT json_group_array(t.name) FROM note_tags nt JOIN tags t ON t.id = nt.tag_id"
+            " WHERE nt.note_id = notes.id) FROM notes WHERE id > ? ORDER BY id LIMIT ?", 0, EXPORT_BATCH_SIZE
+        ):
+            _, heading, value, codec, folder_id, color, body_color, note_date, created_at, tags = row
+            out.write(_dump({
+                "type": "note",
+                "heading": heading,
+                "description": compression.decode(value, codec) or "",
+                "folder": folder_names.get(folder_id),
+                "color": color,
+                "body_color": body_color,
+                "note_date": note_date,
+                "created_at": created_at,
+                "tags": sorted(json.loads(tags)),
+            }))
+            exported += 1
+            if progress and exported % EXPORT_BATCH_SIZE == 0:
+                progress(exported)
+    return exported
+
+
+def _read(path):
+    with _open(path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"line {line_no}: {e}") from None
+            if record.get("type") == "note" and not record.get("heading"):
+                raise ValueError(f"line {line_no}: note without a heading")
+            yield record
+
+
+def _prepare(codec, min_bytes, record):
+    # The CPU-heavy part of an import; runs in worker processes when asked.
+    # Notes come back with the columns the apps would have computed.
+    if record.get("type") != "note":
+        return record, None
+    return record, prepare_body(record.get("description"), codec, min_bytes)
+
+
+def _folder_id(conn, folders, name):
+    if name is None:
+        return None
+    if name not in folders:
+        conn.execute("INSERT OR IGNORE INTO folders (name) VALUES (?)", (name,))
+        folders[name] = conn.execute("SELECT id FROM folders WHERE name = ?", (name,)).fetchone()[0]
+    return folders[name]
+
+
+def _write_batch(store, batch, folders):
+    images = {}
+    with store.pool.transaction() as conn:
+        rows = []
+        for record, body in batch:
+            kind = record.get("type")
+            if kind == "folder":
+                _folder_id(conn, folders, record["name"])
+            elif kind == "blob":
+                data = base64.b64decode(record["data"])
+                if hashlib.sha256(data).hexdigest() != record["hash"] or record["mime"] not in blobs.EXTENSIONS:
+                    raise ValueError(f"blob {record['hash']}: data does not match its hash or type")
+                images[record["hash"]] = (record["mime"], data)
+            elif kind == "note":
+                images.update(body.images)
+                rows.append(((
+                    record["heading"], body.stored, body.codec, _folder_id(conn, folders, record.get("folder")),
+                    sanitize.sanitize_color(record.get("color"), sanitize.DEFAULT_BANNER_COLOR),
+                    sanitize.sanitize_color(record.get("body_color"), sanitize.DEFAULT_BODY_COLOR),
+                    body.preview, body.search_text, sanitize.SANITIZER_VERSION,
+                    record.get("note_date"), record.get("created_at"),
+                ), record.get("tags")))
+        blobs.insert(conn, images)
+        # Notes go in in input order, so ids follow the file. Runs of untagged
+        # notes share an executemany; tagged ones are inserted one by one, for
+        # their ids.
+        for tagged, run in itertools.groupby(rows, key=lambda row: bool(row[1])):
+            if tagged:
+                for row, tags in run:
+                    tagging.set_note_tags(conn, conn.execute(_INSERT_NOTE, row).lastrowid, tags)
+            else:
+                conn.executemany(_INSERT_NOTE, [row for row, _ in run])
+    blobs.write_files(store.blob_dir, images)
+    return len(rows)
+
+
+def _prepared_batches(records, batch_size, prepare, workers):
+    # With a worker pool the next batch is prepared while the current one is
+    # being written; at most two batches are held in memory either way.
+    pending = None
+    while True:
+        chunk = list(itertools.islice(records, batch_size))
+        if workers is None:
+            if not chunk:
+                return
+            yield [prepare(record) for record in chunk]
+            continue
+        upcoming = workers.map_async(prepare, chunk, chunksize=256) if chunk else None
+        if pending is not None:
+            yield pending.get()
+        if upcoming is None:
+            return
+        pending = upcoming
+
+
+def import_jsonl(store, path, batch_size=BATCH_SIZE, workers=1, progress=None):
+    return import_records(store, _read(path), batch_size, workers, progress)
+
+
+def import_records(store, records, batch_size=BATCH_SIZE, workers=1, progress=None):
+    # records is any iterable of dicts in the JSONL record format. One
+    # transaction per batch; folders are matched by name and created when
+    # missing.
+    records = iter(records)
+    with store.pool.connection() as conn:
+        folders = {name: folder_id for folder_id, name in conn.execute("SELECT id, name FROM folders")}
+    prepare = functools.partial(_prepare, store.compression_codec, store.compress_min_bytes)
+    imported = 0
+    worker_pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        for batch in _prepared_batches(records, batch_size, prepare, worker_pool):
+            imported += _write_batch(store, batch, folders)
+            if progress:
+                progress(imported)
+        return imported
+    finally:
+        if worker_pool:
+            worker_pool.terminate()
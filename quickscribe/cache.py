@@ -0,0 +1,134 @@
+import collections
+import threading
+import time
+
+# In-process caches shared by every session of a Streamlit server.
+# The app scripts are re-executed on each rerun, but the NoteStore they share
+# is not, so anything kept here lives for the life of the server process.
+
+
+class LRUCache:
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_build(self, key, build):
+        # build() runs outside the lock; two sessions missing on the same key
+        # at once both build it, which is harmless for pure renders.
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ReadCache:
+    # Query results grouped into scopes such as ("folders",), ("folder", id)
+    # or ("date", "2024-01-31"). Each scope has a generation that is part of
+    # every cache key, so a write moves the generation of the scopes it touched
+    # and only those entries become unreachable; everything else stays warm. A
+    # load racing with a write files its result under the old generation,
+    # where nobody will look for it.
+    #
+    # Generations are change_log sequence numbers (see changes.py), so the
+    # same change seen twice - once from the local write, once when polling
+    # the log - only invalidates once.
+    #
+    # clear() forgets the generations and starts a new epoch, which is also
+    # part of every key: a load that started before the clear files its
+    # result under the old epoch, so it cannot match once generations start
+    # again from 0.
+
+    def __init__(self, maxsize, ttl=None):
+        self._entries = LRUCache(maxsize, ttl)
+        self._generations = collections.defaultdict(int)
+        self._epoch = 0
+        self._counts = collections.defaultdict(lambda: [0, 0])
+        self._lock = threading.Lock()
+
+    def get_or_load(self, scope, key, load):
+        missing = object()
+        with self._lock:
+            cache_key = (scope, self._epoch, self._generations[scope], key)
+        value = self._entries.get(cache_key, missing)
+        counts = self._counts[scope[0]]
+        if value is missing:
+            counts[1] += 1
+            value = load()
+            self._entries.put(cache_key, value)
+        else:
+            counts[0] += 1
+        return value
+
+    def invalidate(self, *scopes, version):
+        with self._lock:
+            for scope in scopes:
+                self._generations[scope] = max(self._generations[scope], version)
+
+    def clear(self):
+        with self._lock:
+            self._generations.clear()
+            self._epoch += 1
+        self._entries.clear()
+
+    def stats(self):
+        stats = self._entries.stats()
+        stats["by_kind"] = {
+            kind: {"hits": hits, "misses": misses,
+                   "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+            for kind, (hits, misses) in self._counts.items()
+        }
+        return stats
+
+
+def note_scopes(folder_id, note_date):
+    # Listings a note appears in: its folder, tag filters and, for dated
+    # notes, its day and the calendar aggregates
+    scopes = [("folder", folder_id), ("tags",)]
+    if note_date:
+        scopes += [("date", note_date), ("calendar",)]
+    return scopes
@@ -0,0 +1,38 @@
+import html
+
+# Note card HTML, shared by the apps and the benchmarks so both exercise the
+# same rendering path. Pure string building: a closed card shows the escaped
+# preview from the listing, an opened one the note's render-ready body.
+
+
+def text_color(bg_color):
+    # Black or white, whichever reads better on bg_color
+    try:
+        hex_color = bg_color.lstrip('#')
+        r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+    except (AttributeError, ValueError):
+        return '#000000'
+    luminance = (0.299 * r + 0.587 * g + 0.114 * b) / 255
+    return '#000000' if luminance > 0.5 else '#FFFFFF'
+
+
+def render_card(store, card, opened, contrast_text=False):
+    safe_heading = html.escape(card.heading)
+    if opened:
+        # Stored bodies are sanitized on write
+        note = store.get_note(card.id)
+        safe_description = note.description if note else ""
+    else:
+        # Preview is already escaped plain text
+        safe_description = card.preview or ""
+    # Colors are validated on write; escaped anyway, as rows can predate that
+    content_style = f' style="color: {html.escape(text_color(card.body_color))};"' if contrast_text else ""
+    return f"""
+                <div class="note-card-display" style="background-color: {html.escape(card.body_color or '')};">
+                    <div class="note-banner-display" style="background-color: {html.escape(card.color or '')};"></div>
+                    <div class="note-content-display"{content_style}>
+                        <h3 class="note-heading-display">{safe_heading}</h3>
+                        <div class="note-description-display">{safe_description}</div>
+                    </div>
+                </div>
+                """
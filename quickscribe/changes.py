@@ -0,0 +1,79 @@
+import threading
+
+# Cross-process cache coherence. Several Streamlit workers can share one
+# notes.db; triggers append every affected listing to change_log (see
+# migrations.py) and each process calls NoteStore.sync() at the top of a
+# rerun. The common case costs one PRAGMA data_version on a dedicated
+# connection; only when another connection has committed is the log read, and
+# only the scopes it names are invalidated.
+
+# Past this many pending changes it is cheaper to drop the whole cache
+MAX_REPLAY = 1000
+
+
+def latest_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+
+def _scopes(kind, scope_key):
+    if kind == "folders":
+        return [("folders",)]
+    if kind == "date":
+        # Month/range aggregates cover every day
+        return [("date", scope_key), ("calendar",)]
+    if kind == "folder":
+        # Edits are logged the same way as adds and deletes, so they refresh
+        # the counts too. Tag filters and counts are cached as a whole.
+        return [("folder", scope_key), ("folder_counts",), ("tags",)]
+    return [(kind, scope_key)]
+
+
+class ChangeFeed:
+    def __init__(self, pool, read_cache):
+        self._pool = pool
+        self._read_cache = read_cache
+        self._lock = threading.Lock()
+        self._conn = None
+        self._data_version = None
+        self._last_seq = None
+
+    def _reset(self):
+        self._last_seq = latest_seq(self._conn)
+        self._read_cache.clear()
+
+    def sync(self):
+        # Returns the number of change_log rows applied.
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._pool.open_connection()
+                self._reset()
+            conn = self._conn
+
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return 0
+            self._data_version = data_version
+
+            last_seq = self._last_seq
+            first, newest = conn.execute(
+                "SELECT MIN(seq), MAX(seq) FROM change_log"
+            ).fetchone()
+            if newest is None or newest <= last_seq:
+                return 0
+            if first > last_seq + 1 or newest - last_seq > MAX_REPLAY:
+                # Fell behind the pruned log, or too much to replay precisely
+                self._reset()
+                return newest - last_seq
+            rows = conn.execute(
+                "SELECT seq, kind, scope_key FROM change_log WHERE seq > ? ORDER BY seq", (last_seq,)
+            ).fetchall()
+            for seq, kind, scope_key in rows:
+                self._read_cache.invalidate(*_scopes(kind, scope_key), version=seq)
+            self._last_seq = rows[-1][0]
+            return len(rows)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
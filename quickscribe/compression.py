@@ -0,0 +1,186 @@
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Optional compression of large note bodies. Quill HTML repeats the same tags
+# and style attributes over and over, so big descriptions shrink a lot. Off by
+# default; enable per deployment with:
+#
+#   QUICKSCRIBE_COMPRESSION=zlib      (or zstd, with the zstandard package)
+#   QUICKSCRIBE_COMPRESS_MIN_BYTES=4096
+#
+# or the matching NoteStore arguments. notes.description_codec records how
+# each row is stored ('' for plain text), so rows written under different
+# settings are read side by side. Listings and search never select
+# description; only opening a note decodes it.
+#
+#   python -m quickscribe compression --stats   # ratio and decode cost by body size
+#   python -m quickscribe compression --apply   # re-encode rows under the current settings
+
+MIN_BYTES = 4096
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, ZLIB_LEVEL), zlib.decompress),
+}
+if zstandard is not None:
+    # Compressor objects are not thread-safe, so each call makes its own
+    CODECS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+SIZE_BUCKETS = [1024, 4096, 16384, 65536, None]
+
+_lock = threading.Lock()
+_decodes = {"count": 0, "stored_bytes": 0, "raw_bytes": 0, "seconds": 0.0}
+
+
+def _codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"unknown or unavailable compression codec {name!r}") from None
+
+
+def encode(description, codec, min_bytes=MIN_BYTES):
+    # Returns (value to store, codec). Bodies under the threshold, or that
+    # would not get smaller, stay plain text.
+    if not codec or not description:
+        return description, ""
+    compress = _codec(codec)[0]
+    raw = description.encode("utf-8")
+    if len(raw) < min_bytes:
+        return description, ""
+    packed = compress(raw)
+    if len(packed) >= len(raw):
+        return description, ""
+    return packed, codec
+
+
+def decode(value, codec):
+    if not codec:
+        return value
+    decompress = _codec(codec)[1]
+    start = time.perf_counter()
+    raw = decompress(value)
+    elapsed = time.perf_counter() - start
+    with _lock:
+        _decodes["count"] += 1
+        _decodes["stored_bytes"] += len(value)
+        _decodes["raw_bytes"] += len(raw)
+        _decodes["seconds"] += elapsed
+    return raw.decode("utf-8")
+
+
+def decode_stats():
+    # Decodes done by this process so far
+    with _lock:
+        stats = dict(_decodes)
+    stats["ratio"] = stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0.0
+    stats["mean_us"] = stats["seconds"] / stats["count"] * 1e6 if stats["count"] else 0.0
+    return stats
+
+
+def _bucket_label(limit):
+    if limit is None:
+        return f">= {SIZE_BUCKETS[-2] // 1024}K"
+    return f"< {limit // 1024}K"
+
+
+def _stream_bodies(pool, batch_size=500):
+    last_id = 0
+    while True:
+        with pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, description, description_codec FROM notes WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+def storage_summary(store):
+    # What is on disk now, per codec
+    with store.pool.connection() as conn:
+        return conn.execute(
+            "SELECT description_codec, COUNT(*), SUM(length(CAST(description AS BLOB)))"
+            " FROM notes GROUP BY description_codec ORDER BY description_codec"
+        ).fetchall()
+
+
+def measure(store, codecs=None, progress=None):
+    # Compresses every body with each codec and times decoding it, grouped by
+    # raw size so MIN_BYTES can be picked where the ratio starts paying for
+    # the decode. Rows are streamed in batches, not loaded all at once.
+    codecs = codecs or list(CODECS)
+    buckets = {
+        (codec, limit): {"notes": 0, "raw_bytes": 0, "stored_bytes": 0, "decode_us": []}
+        for codec in codecs for limit in SIZE_BUCKETS
+    }
+    for done, (_, value, stored_codec) in enumerate(_stream_bodies(store.pool), 1):
+        raw = (decode(value, stored_codec) or "").encode("utf-8")
+        limit = next(limit for limit in SIZE_BUCKETS if limit is None or len(raw) < limit)
+        for codec in codecs:
+            compress, decompress = CODECS[codec]
+            packed = compress(raw)
+            start = time.perf_counter()
+            decompress(packed)
+            bucket = buckets[(codec, limit)]
+            bucket["decode_us"].append((time.perf_counter() - start) * 1e6)
+            bucket["notes"] += 1
+            bucket["raw_bytes"] += len(raw)
+            bucket["stored_bytes"] += len(packed)
+        if progress and done % 1000 == 0:
+            progress(done)
+    return buckets
+
+
+def apply(store, batch_size=500, progress=None):
+    # Re-encodes every row whose storage differs from the store's settings,
+    # one short transaction per batch.
+    batch = []
+    changed = 0
+    for note_id, value, codec in _stream_bodies(store.pool, batch_size):
+        new_value, new_codec = store.encode_body(decode(value, codec))
+        if new_codec != codec:
+            batch.append((new_value, new_codec, note_id))
+        if len(batch) >= batch_size:
+            changed += _write_batch(store.pool, batch)
+            batch = []
+            if progress:
+                progress(changed)
+    changed += _write_batch(store.pool, batch)
+    return changed
+
+
+def _write_batch(pool, batch):
+    if batch:
+        with pool.transaction() as conn:
+            conn.executemany("UPDATE notes SET description = ?, description_codec = ? WHERE id = ?", batch)
+    return len(batch)
+
+
+def print_stats(store):
+    print(f"{'codec':<8}{'notes':>10}{'stored MB':>12}")
+    for codec, notes, stored in storage_summary(store):
+        print(f"{codec or 'plain':<8}{notes:>10}{(stored or 0) / 1e6:>12.2f}")
+    print()
+    buckets = measure(store, progress=lambda done: print(f"\rmeasured {done} notes", end="", flush=True))
+    print("\r", end="")
+    print(f"{'codec':<8}{'raw size':>10}{'notes':>10}{'raw MB':>10}{'ratio':>8}{'decode us':>11}{'p99 us':>9}")
+    for (codec, limit), bucket in buckets.items():
+        if not bucket["notes"]:
+            continue
+        timings = sorted(bucket["decode_us"])
+        print(f"{codec:<8}{_bucket_label(limit):>10}{bucket['notes']:>10}"
+              f"{bucket['raw_bytes'] / 1e6:>10.2f}{bucket['raw_bytes'] / bucket['stored_bytes']:>8.2f}"
+              f"{sum(timings) / len(timings):>11.1f}{timings[int(len(timings) * 0.99)]:>9.1f}")
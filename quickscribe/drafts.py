@@ -0,0 +1,182 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+
+from . import sanitize
+
+# Autosaved drafts of the apps' note forms, in the drafts table (see
+# migrations.py), keyed on (owner, note_id): owner identifies a browser tab
+# and note_id is the note being edited, 0 for the new-note form.
+#
+# The forms call put() on every rerun, which is every time a field changes.
+# Puts only replace the latest content in memory (a put that changes
+# nothing is dropped after one primary-key read); a background thread
+# writes what has changed in one transaction once the oldest unsaved change
+# is debounce seconds old, or as soon as max_pending_bytes are waiting. A
+# tab typing steadily costs one write every debounce seconds instead of one
+# per rerun. discard() runs right away, so a draft never outlives the save
+# it was for, and close() (also run at interpreter exit) writes whatever is
+# still pending.
+#
+# A batch that fails to write (the database stayed locked) is logged and
+# retried after a delay that doubles up to MAX_RETRY_DELAY.
+#
+# Only unwritten changes are held in memory; everything else is read from
+# the table, so other processes' writes and discards are seen at once.
+# Drafts are stored as the form sent them, which keeps that comparison
+# exact, and get() sanitizes the body on the way out.
+
+DEBOUNCE = 2.0
+MAX_PENDING_BYTES = 256 * 1024
+KEEP_DAYS = 30
+MAX_RETRY_DELAY = 60.0
+
+_log = logging.getLogger(__name__)
+
+_UPSERT = (
+    "INSERT INTO drafts (owner, note_id, heading, description, tags, updated_at)"
+    " VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)"
+    " ON CONFLICT (owner, note_id) DO UPDATE SET heading = excluded.heading,"
+    " description = excluded.description, tags = excluded.tags, updated_at = excluded.updated_at"
+)
+_DELETE = "DELETE FROM drafts WHERE owner = ? AND note_id = ?"
+
+
+def _size(content):
+    return sum(map(len, content)) if content else 0
+
+
+class Drafts:
+    def __init__(self, pool, debounce=DEBOUNCE, max_pending_bytes=MAX_PENDING_BYTES):
+        self._pool = pool
+        self.debounce = debounce
+        self.max_pending_bytes = max_pending_bytes
+        # key -> (heading, description, tags), or None to delete the draft:
+        # changes not written yet
+        self._pending = {}
+        self._since = None  # when the oldest pending change was made
+        self._pending_bytes = 0
+        self._retry_at = None  # after a failed write, when to try again
+        self._changed = threading.Condition()
+        # Held while a batch is written, so discard() cannot be overtaken by
+        # an older copy of the draft
+        self._writing = threading.Lock()
+        self._closed = False
+        self.flushes = 0
+        with pool.transaction() as conn:
+            conn.execute("DELETE FROM drafts WHERE updated_at < datetime('now', ?)", (f"-{KEEP_DAYS} days",))
+        self._thread = threading.Thread(target=self._run, name="quickscribe-drafts", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _stored(self, key):
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT heading, description, tags FROM drafts WHERE owner = ? AND note_id = ?",
+                                key).fetchone()
+
+    def get(self, owner, note_id):
+        key = (owner, note_id)
+        with self._changed:
+            pending = key in self._pending
+            content = self._pending.get(key)
+        if not pending:
+            content = self._stored(key)
+        if content is None:
+            return None
+        heading, description, tags = content
+        return heading, sanitize.sanitize_html(description), tags
+
+    def put(self, owner, note_id, content):
+        # content is (heading, description, tags), or None to drop the draft
+        key = (owner, note_id)
+        content = tuple(content) if content is not None else None
+        with self._changed:
+            pending = key in self._pending
+            if pending and self._pending[key] == content:
+                return
+        if not pending and self._stored(key) == content:
+            return
+        with self._changed:
+            if not self._pending:
+                self._since = time.monotonic()
+            self._pending_bytes += _size(content) - _size(self._pending.get(key))
+            self._pending[key] = content
+            self._changed.notify()
+
+    def discard(self, owner, note_id):
+        key = (owner, note_id)
+        with self._writing:
+            with self._changed:
+                if key in self._pending:
+                    self._pending_bytes -= _size(self._pending.pop(key))
+            with self._pool.transaction() as conn:
+                conn.execute(_DELETE, key)
+
+    def flush(self):
+        with self._writing:
+            with self._changed:
+                batch, self._pending = self._pending, {}
+                self._pending_bytes = 0
+            if not batch:
+                return
+            try:
+                with self._pool.transaction() as conn:
+                    conn.executemany(_UPSERT, [(*key, *content) for key, content in batch.items()
+                                               if content is not None])
+                    conn.executemany(_DELETE, [key for key, content in batch.items() if content is None])
+            except Exception:
+                # Back in the queue unless changed since, retried after
+                # another debounce interval
+                with self._changed:
+                    for key, content in batch.items():
+                        if key not in self._pending:
+                            self._pending[key] = content
+                            self._pending_bytes += _size(content)
+                    self._since = time.monotonic()
+                raise
+            self.flushes += 1
+
+    def close(self):
+        with self._changed:
+            if self._closed:
+                return
+            self._closed = True
+            self._changed.notify()
+        atexit.unregister(self.close)
+        self._thread.join()
+        self.flush()
+
+    def _due(self):
+        # Seconds until the pending changes should be written, None if none
+        if not self._pending:
+            return None
+        if self._retry_at is not None:
+            return max(0, self._retry_at - time.monotonic())
+        if self._pending_bytes >= self.max_pending_bytes:
+            return 0
+        return max(0, self._since + self.debounce - time.monotonic())
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._changed:
+                while not self._closed and self._due() != 0:
+                    self._changed.wait(self._due())
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # The batch is queued again
+                failures += 1
+                delay = min(self.debounce * 2 ** failures, MAX_RETRY_DELAY)
+                with self._changed:
+                    self._retry_at = time.monotonic() + delay
+                    waiting = len(self._pending)
+                _log.exception("writing %d drafts failed; retrying in %.1f s", waiting, delay)
+            else:
+                failures = 0
+                with self._changed:
+                    self._retry_at = None
@@ -0,0 +1,288 @@
+import datetime
+import difflib
+import itertools
+import json
+import re
+import zlib
+
+# Revision history of note headings and bodies, in note_revisions (see
+# migrations.py). A note gets history on its first edit: the content it had
+# is stored as a snapshot, then every edit that changes the heading or body
+# adds a row for the new content, as a delta against the row before it.
+# Every SNAPSHOT_EVERY rows (or whenever a delta would not be smaller) a
+# full snapshot starts a new chain, so rebuilding any revision applies at
+# most SNAPSHOT_EVERY - 1 deltas. Rows hold zlib-compressed data; bodies are
+# the stored (sanitized) HTML.
+#
+# Retention: a note keeps at most MAX_REVISIONS rows, the oldest dropped as
+# it edits past that. Pruning (python -m quickscribe history --prune) also
+# thins revisions older than KEEP_DAYS to the last one of each day, so
+# history grows with the days a note was worked on, not with every save.
+#
+#   python -m quickscribe history --stats
+#   python -m quickscribe history --prune
+
+SNAPSHOT_EVERY = 16
+MAX_REVISIONS = 100
+KEEP_DAYS = 30
+# Past this many changed tokens the middle of an edit is stored whole
+# instead of diffed, which keeps the diff cost bounded on large rewrites
+MAX_DIFF_TOKENS = 4000
+
+# Tags, words with their leading whitespace, and leftovers; joined back
+# together they give the original text
+_TOKEN = re.compile(r"<[^>]*>|\s*[^<\s]+|\s+|<")
+_BLOCK_END = re.compile(r"(</(?:p|h[1-6]|li|ul|ol|blockquote|pre)>|<br>)")
+
+
+def _tokens(text):
+    tokens = _TOKEN.findall(text)
+    return tokens, [0, *itertools.accumulate(map(len, tokens))]
+
+
+def _common(old, new, prefix=True):
+    # Length of the common prefix (or suffix) by bisection, comparing
+    # slices rather than one character at a time
+    low, high = 0, min(len(old), len(new))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[:mid] == new[:mid] if prefix else old[len(old) - mid:] == new[len(new) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def make_delta(old, new):
+    # Ops rebuilding new from old: [start, end] copies old[start:end], a
+    # string is inserted. Edits are usually local, so the common prefix and
+    # suffix are matched first (widened to the nearest tag) and only the
+    # middle is tokenized and goes through difflib.
+    start = _common(old, new)
+    start = old.rfind(">", 0, start) + 1
+    suffix = _common(old[start:], new[start:], prefix=False)
+    old_stop = old.find("<", len(old) - suffix)
+    old_stop = len(old) if old_stop < 0 else old_stop
+    new_stop = len(new) - (len(old) - old_stop)
+
+    old_tokens, old_offsets = _tokens(old[start:old_stop])
+    new_tokens, new_offsets = _tokens(new[start:new_stop])
+    if max(len(old_tokens), len(new_tokens)) > MAX_DIFF_TOKENS:
+        opcodes = [("replace", 0, len(old_tokens), 0, len(new_tokens))]
+    else:
+        matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+        opcodes = matcher.get_opcodes()
+    ops = [[0, start]] if start else []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            ops.append([start + old_offsets[i1], start + old_offsets[i2]])
+        elif j2 > j1:
+            ops.append(new[start + new_offsets[j1]:start + new_offsets[j2]])
+    if old_stop < len(old):
+        ops.append([old_stop, len(old)])
+    return ops
+
+
+def apply_delta(old, ops):
+    return "".join(old[op[0]:op[1]] if isinstance(op, list) else op for op in ops)
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(data))
+
+
+def _encode(previous, body, depth):
+    # (kind, data, depth) for a new row after one holding previous
+    if previous is None or depth + 1 >= SNAPSHOT_EVERY:
+        return "snapshot", _pack(body), 0
+    delta = _pack(make_delta(previous, body))
+    # A delta this much smaller than the body beats any snapshot, without
+    # compressing the body to find out
+    if len(delta) * 8 >= len(body):
+        snapshot = _pack(body)
+        if len(delta) >= len(snapshot):
+            return "snapshot", snapshot, 0
+    return "delta", delta, depth + 1
+
+
+def _now():
+    # The format and clock (UTC) of SQLite's CURRENT_TIMESTAMP
+    return datetime.datetime.now(datetime.UTC).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _insert(conn, note_id, revision, saved_at, heading, body, kind, data, depth):
+    conn.execute(
+        "INSERT OR REPLACE INTO note_revisions (note_id, revision, saved_at, heading, kind, data, depth, size)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (note_id, revision, saved_at, heading, kind, data, depth, len(body))
+    )
+
+
+def content(conn, note_id, revision):
+    # (heading, body) of a stored revision, None if there is no such row.
+    # Reads the chain from the nearest snapshot at or before it.
+    rows = conn.execute(
+        "SELECT revision, heading, kind, data FROM note_revisions"
+        " WHERE note_id = ?1 AND revision <= ?2 AND revision >= (SELECT MAX(revision) FROM note_revisions"
+        "     WHERE note_id = ?1 AND revision <= ?2 AND kind = 'snapshot')"
+        " ORDER BY revision",
+        (note_id, revision)
+    ).fetchall()
+    if not rows or rows[-1][0] != revision:
+        return None
+    body = None
+    for _, heading, kind, data in rows:
+        body = _unpack(data) if kind == "snapshot" else apply_delta(body, _unpack(data))
+    return heading, body
+
+
+def all_bodies(conn, note_id=None):
+    # Every stored revision body (of one note, or of all of them), one
+    # note's chain after another
+    if note_id is None:
+        rows = conn.execute("SELECT kind, data FROM note_revisions ORDER BY note_id, revision")
+    else:
+        rows = conn.execute("SELECT kind, data FROM note_revisions WHERE note_id = ? ORDER BY revision", (note_id,))
+    body = None
+    for kind, data in rows:
+        body = _unpack(data) if kind == "snapshot" else apply_delta(body, _unpack(data))
+        yield body
+
+
+def record(conn, note_id, before, after):
+    # Inside the update's transaction. before/after are (revision, heading,
+    # body, created_at) of the note around the update.
+    last = conn.execute(
+        "SELECT revision, depth FROM note_revisions WHERE note_id = ? ORDER BY revision DESC LIMIT 1", (note_id,)
+    ).fetchone()
+    if before[1:3] == after[1:3]:
+        # Only the colors changed: the newest row still holds the current
+        # content, so it moves up to the new revision number
+        if last is not None and last[0] == before[0]:
+            conn.execute("UPDATE note_revisions SET revision = ? WHERE note_id = ? AND revision = ?",
+                         (after[0], note_id, before[0]))
+        return
+    previous = None
+    depth = 0
+    if last is not None and last[0] == before[0]:
+        previous, depth = before[2], last[1]
+    else:
+        # No history yet, or the note changed without it (e.g. a backfill):
+        # the content being replaced starts a new chain
+        _insert(conn, note_id, before[0], before[3] if before[0] == 0 else None, before[1], before[2],
+                "snapshot", _pack(before[2]), 0)
+        previous = before[2]
+    _insert(conn, note_id, after[0], _now(), after[1], after[2], *_encode(previous, after[2], depth))
+    _enforce_limit(conn, note_id)
+
+
+def _enforce_limit(conn, note_id):
+    # Drops the oldest rows past MAX_REVISIONS; the new oldest becomes a
+    # snapshot so the rest still rebuild
+    oldest = conn.execute(
+        "SELECT revision FROM note_revisions WHERE note_id = ? ORDER BY revision DESC LIMIT 1 OFFSET ?",
+        (note_id, MAX_REVISIONS - 1)
+    ).fetchone()
+    if oldest is None:
+        return
+    kind = conn.execute("SELECT kind FROM note_revisions WHERE note_id = ? AND revision = ?",
+                        (note_id, oldest[0])).fetchone()[0]
+    if kind != "snapshot":
+        _, body = content(conn, note_id, oldest[0])
+        conn.execute("UPDATE note_revisions SET kind = 'snapshot', data = ?, depth = 0"
+                     " WHERE note_id = ? AND revision = ?", (_pack(body), note_id, oldest[0]))
+    conn.execute("DELETE FROM note_revisions WHERE note_id = ? AND revision < ?", (note_id, oldest[0]))
+
+
+def revisions(conn, note_id):
+    # [(revision, saved_at, heading, size)], newest first. saved_at is None
+    # for content from before the note had history.
+    return conn.execute(
+        "SELECT revision, saved_at, heading, size FROM note_revisions WHERE note_id = ? ORDER BY revision DESC",
+        (note_id,)
+    ).fetchall()
+
+
+def _lines(heading, body):
+    return [f"# {heading}", *_BLOCK_END.sub(r"\1\n", body).splitlines()]
+
+
+def diff(old, new, old_label, new_label):
+    # Unified diff of two (heading, body) pairs, one line per HTML block
+    return "\n".join(difflib.unified_diff(_lines(*old), _lines(*new), old_label, new_label, lineterm=""))
+
+
+def _keep(rows, cutoff):
+    # Revisions pruning keeps: all since cutoff, the last of each day before
+    # it, and the newest whatever its age
+    keep = set()
+    last_of_day = {}
+    for revision, saved_at in rows:
+        if saved_at is None or saved_at >= cutoff:
+            keep.add(revision)
+        else:
+            last_of_day[saved_at[:10]] = revision
+    keep.update(last_of_day.values())
+    keep.add(rows[-1][0])
+    return keep
+
+
+def prune(conn, note_id, now=None):
+    # Rewrites the note's chain with only the revisions _keep picks; returns
+    # the number of rows dropped
+    cutoff = ((now or datetime.datetime.now(datetime.UTC))
+              - datetime.timedelta(days=KEEP_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    rows = conn.execute(
+        "SELECT revision, saved_at, heading, kind, data FROM note_revisions WHERE note_id = ? ORDER BY revision",
+        (note_id,)
+    ).fetchall()
+    if not rows:
+        return 0
+    keep = _keep([(row[0], row[1]) for row in rows], cutoff)
+    if len(keep) == len(rows):
+        return 0
+    conn.execute("DELETE FROM note_revisions WHERE note_id = ?", (note_id,))
+    body = previous = None
+    depth = 0
+    for revision, saved_at, heading, kind, data in rows:
+        body = _unpack(data) if kind == "snapshot" else apply_delta(body, _unpack(data))
+        if revision in keep:
+            kind, packed, depth = _encode(previous, body, depth)
+            _insert(conn, note_id, revision, saved_at, heading, body, kind, packed, depth)
+            previous = body
+    return len(rows) - len(keep)
+
+
+def prune_all(store, batch_size=200, progress=None):
+    # prune() for every note with history, one short transaction per batch
+    # of notes; returns the number of rows dropped
+    last_id = 0
+    dropped = 0
+    while True:
+        with store.pool.connection() as conn:
+            note_ids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT note_id FROM note_revisions WHERE note_id > ? ORDER BY note_id LIMIT ?",
+                (last_id, batch_size)
+            )]
+        if not note_ids:
+            return dropped
+        with store.pool.transaction() as conn:
+            dropped += sum(prune(conn, note_id) for note_id in note_ids)
+        last_id = note_ids[-1]
+        if progress:
+            progress(dropped)
+
+
+def print_stats(store):
+    with store.pool.connection() as conn:
+        notes, rows, snapshots, stored, sizes = conn.execute(
+            "SELECT COUNT(DISTINCT note_id), COUNT(*), COALESCE(SUM(kind = 'snapshot'), 0),"
+            " COALESCE(SUM(length(data)), 0), COALESCE(SUM(size), 0) FROM note_revisions"
+        ).fetchone()
+    print(f"{notes} notes with history, {rows} revisions ({snapshots} snapshots, {rows - snapshots} deltas)")
+    print(f"stored {stored / 1024:.1f} KiB for {sizes / 1024:.1f} KiB of revision bodies"
+          + (f" ({stored / sizes:.1%})" if sizes else ""))
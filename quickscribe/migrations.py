@@ -0,0 +1,407 @@
+from . import preview
+
+# Versioned schema migrations keyed on PRAGMA user_version.
+# NoteStore runs migrate() once when it is created; the apps keep one store per
+# server process, so a Streamlit rerun touches the schema zero times.
+
+
+CHANGE_LOG_KEEP = 5000
+
+
+def _column_names(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _v1_base_schema(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS folders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            heading TEXT NOT NULL,
+            description TEXT,
+            folder_id INTEGER,
+            color TEXT DEFAULT '#FFFFE0',
+            body_color TEXT DEFAULT '#FFFFFF',
+            note_date DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE
+        )
+    """)
+    # Databases created by older versions of the apps may lack these columns
+    columns = _column_names(conn, "notes")
+    if "body_color" not in columns:
+        conn.execute("ALTER TABLE notes ADD COLUMN body_color TEXT DEFAULT '#FFFFFF'")
+    if "note_date" not in columns:
+        conn.execute("ALTER TABLE notes ADD COLUMN note_date DATE")
+
+
+def _v2_listing_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notes_folder ON notes (folder_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notes_date ON notes (note_date, created_at)")
+
+
+def _v3_partial_listing_indexes(conn):
+    # Home/folder listings in notes2.py only show undated notes and the date
+    # view only dated ones, so each gets a partial index that holds just those
+    # rows, ordered to match ORDER BY created_at DESC (the rowid rides along
+    # as the implicit last column). Bodies are not copied into the indexes.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_notes_folder_undated"
+        " ON notes (folder_id, created_at) WHERE note_date IS NULL"
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_notes_date")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_notes_dated"
+        " ON notes (note_date, created_at) WHERE note_date IS NOT NULL"
+    )
+
+
+def _v4_note_previews(conn):
+    # Listings read a short preview instead of the full Quill body. The listing
+    # indexes become covering so a page is served from the index alone and
+    # never walks a large description's overflow pages.
+    if "preview" not in _column_names(conn, "notes"):
+        conn.execute("ALTER TABLE notes ADD COLUMN preview TEXT DEFAULT ''")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, description FROM notes WHERE id > ? ORDER BY id LIMIT 500", (last_id,)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            "UPDATE notes SET preview = ? WHERE id = ?",
+            [(preview.make_preview(description), note_id) for note_id, description in rows]
+        )
+        last_id = rows[-1][0]
+
+    # id must directly follow created_at to serve ORDER BY created_at, id
+    listing_columns = "created_at, id, heading, preview, color, body_color"
+    for name, columns, where in [
+        ("idx_notes_folder", f"folder_id, {listing_columns}", ""),
+        ("idx_notes_folder_undated", f"folder_id, {listing_columns}, note_date", " WHERE note_date IS NULL"),
+        ("idx_notes_dated", f"note_date, {listing_columns}", " WHERE note_date IS NOT NULL"),
+    ]:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.execute(f"CREATE INDEX {name} ON notes ({columns}){where}")
+
+
+def _v5_full_text_search(conn):
+    # FTS5 cannot strip HTML itself, so notes carry a plain-text copy of the
+    # body (written by the apps) and an external-content index over it is
+    # kept in sync by triggers. Prefix indexes keep search-as-you-type fast.
+    if "search_text" not in _column_names(conn, "notes"):
+        conn.execute("ALTER TABLE notes ADD COLUMN search_text TEXT DEFAULT ''")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, description FROM notes WHERE id > ? ORDER BY id LIMIT 500", (last_id,)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            "UPDATE notes SET search_text = ? WHERE id = ?",
+            [(preview.html_to_text(description), note_id) for note_id, description in rows]
+        )
+        last_id = rows[-1][0]
+
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            heading, search_text,
+            content='notes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, heading, search_text)
+            VALUES (new.id, new.heading, new.search_text);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, heading, search_text)
+            VALUES ('delete', old.id, old.heading, old.search_text);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF heading, search_text ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, heading, search_text)
+            VALUES ('delete', old.id, old.heading, old.search_text);
+            INSERT INTO notes_fts (rowid, heading, search_text)
+            VALUES (new.id, new.heading, new.search_text);
+        END
+    """)
+    conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+    # Matches in the heading count five times as much as matches in the body
+    conn.execute("INSERT INTO notes_fts (notes_fts, rank) VALUES ('rank', 'bm25(5.0, 1.0)')")
+
+
+def _v6_sanitizer_version(conn):
+    # Bodies are sanitized on write; rows from before that stay at version 0
+    # until `python -m quickscribe sanitize` reprocesses them.
+    if "sanitizer_version" not in _column_names(conn, "notes"):
+        conn.execute("ALTER TABLE notes ADD COLUMN sanitizer_version INTEGER NOT NULL DEFAULT 0")
+
+
+def _v7_note_revisions(conn):
+    # Every content edit bumps notes.revision, whichever process or script
+    # made it, so rendered cards can be cached on (id, revision). The listing
+    # indexes gain the column to stay covering.
+    if "revision" not in _column_names(conn, "notes"):
+        conn.execute("ALTER TABLE notes ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_bump_revision
+        AFTER UPDATE OF heading, description, color, body_color ON notes BEGIN
+            UPDATE notes SET revision = revision + 1 WHERE id = new.id;
+        END
+    """)
+    listing_columns = "created_at, id, heading, preview, color, body_color, revision"
+    for name, columns, where in [
+        ("idx_notes_folder", f"folder_id, {listing_columns}", ""),
+        ("idx_notes_folder_undated", f"folder_id, {listing_columns}, note_date", " WHERE note_date IS NULL"),
+        ("idx_notes_dated", f"note_date, {listing_columns}", " WHERE note_date IS NOT NULL"),
+    ]:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.execute(f"CREATE INDEX {name} ON notes ({columns}){where}")
+
+
+def _v8_change_log(conn):
+    # Every write to notes/folders appends the listings it affects, so each
+    # worker process can invalidate exactly those scopes in its read cache.
+    # Note edits are logged through the revision bump; the log prunes itself
+    # to the newest CHANGE_LOG_KEEP rows.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            scope_key
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS change_log_note_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO change_log (kind, scope_key) VALUES ('folder', new.folder_id);
+            INSERT INTO change_log (kind, scope_key)
+                SELECT 'date', new.note_date WHERE new.note_date IS NOT NULL;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS change_log_note_update
+        AFTER UPDATE OF revision, folder_id, note_date ON notes BEGIN
+            INSERT INTO change_log (kind, scope_key) VALUES ('folder', old.folder_id);
+            INSERT INTO change_log (kind, scope_key)
+                SELECT 'folder', new.folder_id WHERE new.folder_id IS NOT old.folder_id;
+            INSERT INTO change_log (kind, scope_key)
+                SELECT 'date', old.note_date WHERE old.note_date IS NOT NULL;
+            INSERT INTO change_log (kind, scope_key)
+                SELECT 'date', new.note_date
+                WHERE new.note_date IS NOT NULL AND new.note_date IS NOT old.note_date;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS change_log_note_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO change_log (kind, scope_key) VALUES ('folder', old.folder_id);
+            INSERT INTO change_log (kind, scope_key)
+                SELECT 'date', old.note_date WHERE old.note_date IS NOT NULL;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS change_log_folder_insert AFTER INSERT ON folders BEGIN
+            INSERT INTO change_log (kind, scope_key) VALUES ('folders', NULL);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS change_log_folder_update AFTER UPDATE ON folders BEGIN
+            INSERT INTO change_log (kind, scope_key) VALUES ('folders', NULL);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS change_log_folder_delete AFTER DELETE ON folders BEGIN
+            INSERT INTO change_log (kind, scope_key) VALUES ('folders', NULL);
+            INSERT INTO change_log (kind, scope_key) VALUES ('folder', old.id);
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS change_log_prune AFTER INSERT ON change_log
+        WHEN new.seq % 500 = 0 BEGIN
+            DELETE FROM change_log WHERE seq <= new.seq - {CHANGE_LOG_KEEP};
+        END
+    """)
+
+
+
+def _v9_blobs(conn):
+    # Content-addressed images moved out of note bodies (see blobs.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            mime TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+
+
+def _v10_description_codec(conn):
+    # '' for plain text, otherwise the codec the body is compressed with
+    # (see compression.py)
+    if "description_codec" not in _column_names(conn, "notes"):
+        conn.execute("ALTER TABLE notes ADD COLUMN description_codec TEXT NOT NULL DEFAULT ''")
+
+
+def _v11_cascade_change_log(conn):
+    # With foreign keys enforced a folder delete cascades to its notes, and
+    # the folder's own trigger already logs its listing. Skip the per-note
+    # 'folder' rows while the folder is gone, so a big folder does not flood
+    # change_log past what other workers replay (see changes.MAX_REPLAY).
+    conn.execute("DROP TRIGGER IF EXISTS change_log_note_delete")
+    conn.execute("""
+        CREATE TRIGGER change_log_note_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO change_log (kind, scope_key)
+                SELECT 'folder', old.folder_id
+                WHERE old.folder_id IS NULL OR EXISTS (SELECT 1 FROM folders WHERE id = old.folder_id);
+            INSERT INTO change_log (kind, scope_key)
+                SELECT 'date', old.note_date WHERE old.note_date IS NOT NULL;
+        END
+    """)
+
+
+def _v12_tags(conn):
+    # Many-to-many tags (see tagging.py). note_tags repeats the note's
+    # created_at so a tag's notes sit in listing order under its key.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            note_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS note_tags (
+            tag_id INTEGER NOT NULL REFERENCES tags(id) ON DELETE CASCADE,
+            created_at TIMESTAMP,
+            note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+            PRIMARY KEY (tag_id, created_at, note_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_note ON note_tags (note_id, tag_id)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS note_tags_count_insert AFTER INSERT ON note_tags BEGIN
+            UPDATE tags SET note_count = note_count + 1 WHERE id = new.tag_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS note_tags_count_delete AFTER DELETE ON note_tags BEGIN
+            UPDATE tags SET note_count = note_count - 1 WHERE id = old.tag_id;
+        END
+    """)
+
+
+def _v13_note_history(conn):
+    # Revision history as snapshots and deltas (see history.py). saved_at is
+    # NULL for content from before a note had history.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS note_revisions (
+            note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+            revision INTEGER NOT NULL,
+            saved_at TIMESTAMP,
+            heading TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            data BLOB NOT NULL,
+            depth INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            PRIMARY KEY (note_id, revision)
+        )
+    """)
+
+
+def _v14_drafts(conn):
+    # Autosaved form contents (see drafts.py); note_id 0 is the new-note
+    # form, so drafts of real notes are dropped by a trigger instead of a
+    # foreign key
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS drafts (
+            owner TEXT NOT NULL,
+            note_id INTEGER NOT NULL,
+            heading TEXT NOT NULL,
+            description TEXT NOT NULL,
+            tags TEXT NOT NULL,
+            updated_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (owner, note_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS drafts_note_delete AFTER DELETE ON notes BEGIN
+            DELETE FROM drafts WHERE note_id = old.id;
+        END
+    """)
+
+
+def _v15_content_revision_bump(conn):
+    # Maintenance rewrites of the stored body (compression --apply, sanitize,
+    # migrate-images) only change how the same content is stored, and set
+    # just description, description_codec and sanitizer_version. Bumping the
+    # revision for them dropped every cached card and logged one change per
+    # note, far past what other workers replay. Edits set preview and
+    # search_text along with the body, so those stand in for it here.
+    conn.execute("DROP TRIGGER IF EXISTS notes_bump_revision")
+    conn.execute("""
+        CREATE TRIGGER notes_bump_revision
+        AFTER UPDATE OF heading, preview, search_text, color, body_color ON notes BEGIN
+            UPDATE notes SET revision = revision + 1 WHERE id = new.id;
+        END
+    """)
+
+
+# Append only: the schema version is the position in this list.
+MIGRATIONS = [
+    _v1_base_schema,
+    _v2_listing_indexes,
+    _v3_partial_listing_indexes,
+    _v4_note_previews,
+    _v5_full_text_search,
+    _v6_sanitizer_version,
+    _v7_note_revisions,
+    _v8_change_log,
+    _v9_blobs,
+    _v10_description_codec,
+    _v11_cascade_change_log,
+    _v12_tags,
+    _v13_note_history,
+    _v14_drafts,
+    _v15_content_revision_bump,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(pool):
+    with pool.connection() as conn:
+        if current_version(conn) < SCHEMA_VERSION:
+            _apply_pending(conn)
+
+
+def _apply_pending(conn):
+    # One transaction per step; BEGIN IMMEDIATE serializes concurrent workers,
+    # so the version is re-read once the write lock is held.
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = current_version(conn)
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                return
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
@@ -0,0 +1,39 @@
+# Notes whose folder_id points at a folder that no longer exists. Until
+# foreign keys were enforced (see db.PRAGMAS) deleting a folder left its notes
+# behind: shown in no listing, but still stored, indexed and scanned.
+#
+#   python -m quickscribe orphans               # count them per missing folder
+#   python -m quickscribe orphans --purge       # delete them
+#   python -m quickscribe orphans --reassign    # move them to Home
+
+ORPHANED = "folder_id IS NOT NULL AND folder_id NOT IN (SELECT id FROM folders)"
+
+
+def find(conn):
+    # {missing folder_id: number of notes}
+    return dict(conn.execute(f"SELECT folder_id, COUNT(*) FROM notes WHERE {ORPHANED} GROUP BY folder_id"))
+
+
+def fix(store, purge=False, batch_size=500, progress=None):
+    # Deletes the orphans (purge) or moves them to Home, one short
+    # transaction per batch. Fixed rows drop out of the query, so each batch
+    # just takes the next ones. The delete trigger skips notes whose folder
+    # is gone (see migrations._v11_cascade_change_log), so a purge logs the
+    # change itself: other workers still cache counts and tags that include
+    # these notes.
+    statement = "DELETE FROM notes WHERE id = ?" if purge else "UPDATE notes SET folder_id = NULL WHERE id = ?"
+    done = 0
+    while True:
+        with store.pool.connection() as conn:
+            rows = conn.execute(f"SELECT id, folder_id FROM notes WHERE {ORPHANED} LIMIT ?",
+                                (batch_size,)).fetchall()
+        if not rows:
+            return done
+        with store.pool.transaction() as conn:
+            conn.executemany(statement, [(note_id,) for note_id, _ in rows])
+            if purge:
+                conn.executemany("INSERT INTO change_log (kind, scope_key) VALUES ('folder', ?)",
+                                 [(folder_id,) for folder_id in {folder_id for _, folder_id in rows}])
+        done += len(rows)
+        if progress:
+            progress(done)
@@ -0,0 +1,59 @@
+import html
+from html.parser import HTMLParser
+
+# Plain-text views of a note's Quill HTML, computed when a note is written so
+# neither listings nor search ever have to parse the body: the full text feeds
+# the FTS index and a short escaped snippet is shown on cards.
+
+PREVIEW_CHARS = 200
+
+_BLOCK_TAGS = {"p", "br", "div", "li", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "tr"}
+_SKIP_TAGS = {"script", "style"}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skipping += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS and self._skipping:
+            self._skipping -= 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append(" ")
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def html_to_text(description):
+    if not description:
+        return ""
+    parser = _TextExtractor()
+    parser.feed(description)
+    parser.close()
+    return " ".join("".join(parser.parts).split())
+
+
+def _truncate(text):
+    if len(text) > PREVIEW_CHARS:
+        text = text[:PREVIEW_CHARS].rstrip() + "…"
+    return html.escape(text)
+
+
+def make_preview(description):
+    return _truncate(html_to_text(description))
+
+
+def text_fields(description):
+    # (plain text for search, card preview) from a single parse of the body
+    text = html_to_text(description)
+    return text, _truncate(text)
@@ -0,0 +1,260 @@
+import collections
+import contextlib
+import datetime
+import functools
+import json
+import sqlite3
+import threading
+import time
+
+# Per-rerun instrumentation, off unless QUICKSCRIBE_PROFILE is set.
+# A trace covers one script run: the app calls start() at the top and
+# finish() at the bottom (a rerun cut short by st.rerun() is closed by the
+# next start() on the same thread, marked incomplete), and a fragment rerun
+# on its own gets a trace of its own (see fragment()). Within it the app
+# marks phases, NoteStore methods record spans, and every SQL statement run
+# on the store's connections is timed with its row count and the bytes it
+# returned. Statements slower than slow_ms keep their EXPLAIN QUERY PLAN.
+#
+# Finished traces are kept in memory for the admin panel and, with
+# QUICKSCRIBE_PROFILE_LOG, appended to a JSONL file for offline analysis.
+
+SLOW_MS = 50.0
+KEEP = 200
+MAX_STATEMENTS = 500  # per trace; the totals keep counting past it
+EXPLAINABLE = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def _size(row):
+    return sum(len(value) for value in row if isinstance(value, (str, bytes)))
+
+
+class Trace:
+    def __init__(self, label):
+        self.label = label
+        self.started = datetime.datetime.now().isoformat(timespec="milliseconds")
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.ms = None
+        self.completed = False
+        self.phases = []
+        self.spans = []
+        self.statements = []
+        self.totals = {"statements": 0, "sql_ms": 0.0, "rows": 0, "bytes": 0}
+        self.stack = []
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "started": self.started,
+            "ms": self.ms,
+            "completed": self.completed,
+            "totals": self.totals,
+            "phases": self.phases,
+            "spans": self.spans,
+            "statements": self.statements,
+        }
+
+
+class Profiler:
+    def __init__(self, enabled=False, slow_ms=SLOW_MS, keep=KEEP, log_path=None):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self._traces = collections.deque(maxlen=keep)
+        self._slow = collections.deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _current(self):
+        return getattr(self._local, "trace", None)
+
+    def start(self, label):
+        if not self.enabled:
+            return
+        if self._current() is not None:
+            self.finish(completed=False)
+        self._local.trace = Trace(label)
+
+    def finish(self, completed=True):
+        trace = self._current()
+        if trace is None:
+            return None
+        self._local.trace = None
+        # An interrupted rerun ends at the last thing it recorded
+        end = time.perf_counter() if completed else trace.last
+        self._end_phase(trace, end)
+        trace.ms = (end - trace.start) * 1000
+        trace.completed = completed
+        record = trace.to_dict()
+        with self._lock:
+            self._traces.append(record)
+            self._slow.extend(s for s in trace.statements if s["ms"] >= self.slow_ms)
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+        return record
+
+    def _end_phase(self, trace, now):
+        if trace.phases and trace.phases[-1]["ms"] is None:
+            trace.phases[-1]["ms"] = (now - trace.start) * 1000 - trace.phases[-1]["at_ms"]
+
+    def phase(self, name):
+        # Everything until the next phase (or the end of the rerun) counts
+        # towards this one, Streamlit's own work included.
+        trace = self._current()
+        if trace is None:
+            return
+        now = time.perf_counter()
+        self._end_phase(trace, now)
+        trace.phases.append({"name": name, "at_ms": (now - trace.start) * 1000, "ms": None})
+        trace.last = now
+
+    @contextlib.contextmanager
+    def _span(self, trace, name):
+        span = {"name": name, "depth": len(trace.stack), "ms": 0.0,
+                "statements": 0, "sql_ms": 0.0, "rows": 0, "bytes": 0}
+        trace.stack.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            trace.last = time.perf_counter()
+            span["ms"] = (trace.last - start) * 1000
+            trace.stack.pop()
+            trace.spans.append(span)
+
+    def span(self, name):
+        trace = self._current()
+        if trace is None:
+            return contextlib.nullcontext()
+        return self._span(trace, name)
+
+    def fragment(self, fn):
+        # Decorator for st.fragment functions: a span when called during a
+        # full rerun, a trace of its own when Streamlit reruns just the
+        # fragment.
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            if self._current() is not None:
+                with self.span(fn.__name__):
+                    return fn(*args, **kwargs)
+            self.start(fn.__name__)
+            completed = False
+            try:
+                result = fn(*args, **kwargs)
+                completed = True
+                return result
+            finally:
+                self.finish(completed)
+        return wrapper
+
+    def statement(self, conn, sql, params, ms, rows, nbytes):
+        trace = self._current()
+        if trace is None:
+            return
+        trace.last = time.perf_counter()
+        for counts in [trace.totals, *trace.stack]:
+            counts["statements"] += 1
+            counts["sql_ms"] += ms
+            counts["rows"] += rows
+            counts["bytes"] += nbytes
+        if len(trace.statements) >= MAX_STATEMENTS:
+            return
+        entry = {"sql": " ".join(sql.split()), "ms": ms, "rows": rows, "bytes": nbytes,
+                 "span": trace.stack[-1]["name"] if trace.stack else None}
+        if ms >= self.slow_ms and params is not None and sql.lstrip()[:6].upper() in EXPLAINABLE:
+            entry["plan"] = explain(conn, sql, params)
+        trace.statements.append(entry)
+
+    def traces(self):
+        with self._lock:
+            return list(self._traces)
+
+    def slow_statements(self):
+        with self._lock:
+            return list(self._slow)
+
+    def to_jsonl(self):
+        return "".join(json.dumps(trace) + "\n" for trace in self.traces())
+
+
+def explain(conn, sql, params):
+    try:
+        # A plain cursor, so the EXPLAIN is not itself recorded
+        rows = conn.cursor(sqlite3.Cursor).execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+    return [row[3] for row in rows]
+
+
+class TimedCursor(sqlite3.Cursor):
+    # A statement is reported once its rows have been read: after fetchone()
+    # or fetchall(), when iteration runs out, or right away if it returns no
+    # rows (writes, DDL).
+    _pending = None
+
+    def _report(self, rows, nbytes, ms):
+        sql, params, elapsed, seen, seen_bytes = self._pending
+        self._pending = None
+        self.connection.profiler.statement(self.connection, sql, params, elapsed + ms,
+                                           seen + rows, seen_bytes + nbytes)
+
+    def _run(self, method, sql, params):
+        start = time.perf_counter()
+        result = method(self, sql, params)
+        ms = (time.perf_counter() - start) * 1000
+        self._pending = (sql, params if method is sqlite3.Cursor.execute else None, ms, 0, 0)
+        if self.description is None:
+            self._report(max(self.rowcount, 0), 0, 0.0)
+        return result
+
+    def execute(self, sql, params=()):
+        return self._run(sqlite3.Cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(sqlite3.Cursor.executemany, sql, seq_of_params)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        if self._pending:
+            self._report(row is not None, _size(row) if row else 0, (time.perf_counter() - start) * 1000)
+        return row
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        if self._pending:
+            self._report(len(rows), sum(map(_size, rows)), (time.perf_counter() - start) * 1000)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            if self._pending:
+                self._report(0, 0, (time.perf_counter() - start) * 1000)
+            raise
+        if self._pending:
+            sql, params, elapsed, seen, seen_bytes = self._pending
+            self._pending = (sql, params, elapsed + (time.perf_counter() - start) * 1000,
+                             seen + 1, seen_bytes + _size(row))
+        return row
+
+
+class TimedConnection(sqlite3.Connection):
+    # Every statement on this connection goes through a TimedCursor
+    profiler = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
@@ -0,0 +1,154 @@
+import functools
+
+# Listing statements shared by the apps and verified by check_query_plans.py.
+# Keep the WHERE/ORDER BY clauses in step with the indexes in migrations.py.
+#
+# Listings are keyset-paginated on (created_at, id): each query comes as a
+# (first page, next page) pair and a page is resumed from the last row seen,
+# so fetching page N costs the same as page 1 however large the folder is.
+
+PAGE_SIZE = 30
+
+# Listings select the precomputed preview, never the full description; every
+# column here is in the covering listing indexes.
+_NOTE_COLUMNS = "SELECT id, heading, preview, color, body_color, revision, created_at FROM notes"
+_ORDER = " ORDER BY created_at DESC, id DESC LIMIT ?"
+
+
+def _paged(where):
+    return (
+        f"{_NOTE_COLUMNS} WHERE {where}{_ORDER}",
+        f"{_NOTE_COLUMNS} WHERE {where} AND (created_at, id) < (?, ?){_ORDER}",
+    )
+
+
+# notes2.py: folder listings hold only undated notes
+NOTES_IN_FOLDER = _paged("folder_id = ? AND note_date IS NULL")
+NOTES_IN_HOME = _paged("folder_id IS NULL AND note_date IS NULL")
+NOTES_ON_DATE = _paged("note_date = ?")
+
+# notes.py: no date view, so folder listings include every note
+ALL_NOTES_IN_FOLDER = _paged("folder_id = ?")
+ALL_NOTES_IN_HOME = _paged("folder_id IS NULL")
+
+# Calendar (notes2.py): dated notes over [start, end). The range implies
+# note_date IS NOT NULL, so both walk idx_notes_dated.
+DAY_COUNTS = (
+    "SELECT note_date, COUNT(*) FROM notes WHERE note_date >= ? AND note_date < ?"
+    " GROUP BY note_date"
+)
+_RANGE_COLUMNS = "SELECT id, heading, preview, color, body_color, revision, note_date, created_at FROM notes"
+_RANGE_ORDER = " ORDER BY note_date DESC, created_at DESC, id DESC"
+NOTES_IN_RANGE = (
+    f"{_RANGE_COLUMNS} WHERE note_date >= ? AND note_date < ?{_RANGE_ORDER} LIMIT ?",
+    # Later pages bound the range by the cursor's day (?3) instead of the end
+    # date (?2), so the index seek starts at the cursor rather than at the end
+    (f"{_RANGE_COLUMNS} WHERE note_date >= ?1 AND note_date <= ?3"
+     f" AND (note_date, created_at, id) < (?3, ?4, ?5){_RANGE_ORDER} LIMIT ?6"),
+)
+
+# Tag filters (see tagging.py), built for a number of tags: the page is found
+# in note_tags, already in listing order, and only its notes are read.
+# AND walks the first (rarest) tag and probes the others through
+# idx_note_tags_note; OR takes a page from each tag and merges them.
+# Parameters: the tag ids, then the cursor on later pages, then the limit.
+_TAGGED = ("SELECT n.id, n.heading, n.preview, n.color, n.body_color, n.revision, m.created_at"
+           " FROM ({}) m CROSS JOIN notes n WHERE n.id = m.note_id ORDER BY m.created_at DESC, m.note_id DESC")
+
+
+@functools.lru_cache(maxsize=64)
+def notes_with_tags(count, match_all):
+    pages = []
+    for after in (False, True):
+        limit = f"?{count + 3}" if after else f"?{count + 1}"
+        if match_all:
+            joins = "".join(f" CROSS JOIN note_tags t{i}" for i in range(2, count + 1))
+            where = "t1.tag_id = ?1" + "".join(
+                f" AND t{i}.tag_id = ?{i} AND t{i}.note_id = t1.note_id AND t{i}.created_at = t1.created_at"
+                for i in range(2, count + 1)
+            )
+            if after:
+                where += f" AND (t1.created_at, t1.note_id) < (?{count + 1}, ?{count + 2})"
+            matches = (f"SELECT t1.created_at, t1.note_id FROM note_tags t1{joins} WHERE {where}"
+                       f" ORDER BY t1.created_at DESC, t1.note_id DESC LIMIT {limit}")
+        else:
+            cursor = f" AND (created_at, note_id) < (?{count + 1}, ?{count + 2})" if after else ""
+            matches = " UNION ".join(
+                f"SELECT * FROM (SELECT created_at, note_id FROM note_tags WHERE tag_id = ?{i}{cursor}"
+                f" ORDER BY created_at DESC, note_id DESC LIMIT {limit})"
+                for i in range(1, count + 1)
+            ) + f" ORDER BY 1 DESC, 2 DESC LIMIT {limit}"
+        pages.append(_TAGGED.format(matches))
+    return tuple(pages)
+
+
+TAGS_IN_USE = "SELECT name, note_count FROM tags WHERE note_count > 0 ORDER BY name"
+NOTE_TAG_IDS = "SELECT tag_id FROM note_tags WHERE note_id = ?"
+NOTE_TAG_NAMES = (
+    "SELECT t.name FROM note_tags nt JOIN tags t ON t.id = nt.tag_id WHERE nt.note_id = ? ORDER BY t.name"
+)
+
+# Full body, fetched only when a note is opened or edited
+NOTE_BY_ID = (
+    "SELECT id, heading, description, color, body_color, sanitizer_version, description_codec"
+    " FROM notes WHERE id = ?"
+)
+
+# One card, for re-rendering a single note after it changed
+NOTE_CARD_BY_ID = "SELECT id, heading, preview, color, body_color, revision FROM notes WHERE id = ?"
+
+# Which listings a note belongs to, for cache invalidation on writes
+NOTE_LOCATION = "SELECT folder_id, note_date FROM notes WHERE id = ?"
+
+# The same for an edit, with the content it replaces for the note's history
+NOTE_BEFORE_EDIT = (
+    "SELECT folder_id, note_date, revision, heading, description, description_codec, created_at"
+    " FROM notes WHERE id = ?"
+)
+
+# Sidebar note counts, over the covering idx_notes_folder
+FOLDER_COUNTS = "SELECT folder_id, COUNT(*) FROM notes WHERE folder_id IS NOT NULL GROUP BY folder_id"
+
+# Days whose listings a folder delete also empties
+FOLDER_NOTE_DATES = "SELECT DISTINCT note_date FROM notes WHERE folder_id = ? AND note_date IS NOT NULL"
+
+# (name, query, sample parameters, sample cursor) for every listing query
+_CURSOR = ("2024-01-01 00:00:00", 1)
+LISTING_QUERIES = [
+    ("notes_in_folder", NOTES_IN_FOLDER, (1,), _CURSOR),
+    ("notes_in_home", NOTES_IN_HOME, (), _CURSOR),
+    ("notes_on_date", NOTES_ON_DATE, ("2024-01-01",), _CURSOR),
+    ("all_notes_in_folder", ALL_NOTES_IN_FOLDER, (1,), _CURSOR),
+    ("all_notes_in_home", ALL_NOTES_IN_HOME, (), _CURSOR),
+    ("notes_in_range", NOTES_IN_RANGE, ("2024-01-01", "2024-02-01"), ("2024-01-15", *_CURSOR)),
+]
+
+# (name, query, sample tag ids, sample cursor) for tag filters. They sort and
+# join only the page they found, so only how they find it is checked.
+TAG_QUERIES = [
+    ("notes_with_all_tags", notes_with_tags(3, True), (1, 2, 3), _CURSOR),
+    ("notes_with_any_tag", notes_with_tags(3, False), (1, 2, 3), _CURSOR),
+]
+
+# (name, query, sample parameters) for aggregates that must stay on an index
+AGGREGATE_QUERIES = [
+    ("day_counts", DAY_COUNTS, ("2024-01-01", "2024-02-01")),
+    ("folder_counts", FOLDER_COUNTS, ()),
+]
+
+
+def fetch_page(conn, query, params, cursor=None, limit=PAGE_SIZE):
+    # Returns (rows, next_cursor); next_cursor is None on the last page.
+    # One extra row is fetched to find out whether another page exists. The
+    # cursor is the sort key of the last row: the columns after the card's,
+    # then its id.
+    first, after = query
+    if cursor is None:
+        rows = conn.execute(first, (*params, limit + 1)).fetchall()
+    else:
+        rows = conn.execute(after, (*params, *cursor, limit + 1)).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (*rows[-1][6:], rows[-1][0])
+    return [row[:6] for row in rows], next_cursor
@@ -0,0 +1,47 @@
+from . import queries
+
+# Runs EXPLAIN QUERY PLAN on every listing and aggregate query and reports any that scan a
+# table/index, sort through a temp B-tree instead of walking an index in
+# order, or have to leave the covering index to read the table.
+#
+#   python -m quickscribe check-plans              # fresh database at the current schema
+#   python -m quickscribe --db notes.db check-plans   # an existing database
+
+
+TABLES = {"notes", "folders", "tags", "note_tags"}
+
+
+def plan_problems(conn, sql, params, bounded=False):
+    # bounded: the query sorts and joins only a page it has already found, so
+    # just flag table scans and note_tags lookups that miss its indexes
+    problems = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        detail = row[3]
+        words = detail.split()
+        if bounded:
+            if (words[0] == "SCAN" and words[1] in TABLES
+                    or words[:2] == ["SEARCH", "note_tags"] and "COVERING INDEX" not in detail
+                    and "PRIMARY KEY" not in detail):
+                problems.append(detail)
+        elif (detail.startswith("SCAN") or "TEMP B-TREE" in detail
+                or detail.startswith("SEARCH") and "COVERING INDEX" not in detail):
+            problems.append(detail)
+    return problems
+
+
+def check(conn):
+    failures = {}
+    for bounded, listings in [(False, queries.LISTING_QUERIES), (True, queries.TAG_QUERIES)]:
+        for name, (first, after), params, cursor in listings:
+            for page, sql, page_params in [
+                ("first", first, (*params, queries.PAGE_SIZE)),
+                ("next", after, (*params, *cursor, queries.PAGE_SIZE)),
+            ]:
+                problems = plan_problems(conn, sql, page_params, bounded)
+                if problems:
+                    failures[f"{name} ({page} page)"] = problems
+    for name, sql, params in queries.AGGREGATE_QUERIES:
+        problems = plan_problems(conn, sql, params)
+        if problems:
+            failures[name] = problems
+    return failures
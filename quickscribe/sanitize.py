@@ -0,0 +1,161 @@
+import html
+import re
+from html.parser import HTMLParser
+
+from . import compression
+
+# Allowlist HTML sanitizer for Quill note bodies, run once when a note is
+# written. The stored description is render-ready, so displaying a note does
+# no regex or parsing work at all. Bump SANITIZER_VERSION whenever the rules
+# change and run the backfill to reprocess older rows:
+#
+#   python -m quickscribe sanitize
+
+SANITIZER_VERSION = 1
+
+ALLOWED_TAGS = {
+    "p", "br", "span", "strong", "b", "em", "i", "u", "s", "strike", "sub", "sup",
+    "a", "ol", "ul", "li", "h1", "h2", "h3", "h4", "h5", "h6",
+    "blockquote", "pre", "code", "img",
+}
+VOID_TAGS = {"br", "img"}
+# Dropped together with everything inside them
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "template", "noscript", "svg", "math"}
+
+GLOBAL_ATTRS = {"class", "style"}
+TAG_ATTRS = {
+    "a": {"href", "target", "rel"},
+    "img": {"src", "alt", "width", "height", "loading"},
+    "pre": {"spellcheck"},
+    "li": {"data-list"},
+}
+URL_ATTRS = {"href", "src"}
+
+_SAFE_URL = re.compile(r"^(?:https?:|mailto:|#|/|[^:/?#]*(?:[/?#]|$))", re.IGNORECASE)
+_SAFE_IMAGE_DATA = re.compile(r"^data:image/(?:png|jpe?g|gif|webp);base64,", re.IGNORECASE)
+_UNSAFE_STYLE = re.compile(r"url\s*\(|expression\s*\(|javascript:|@import|behavior\s*:", re.IGNORECASE)
+_CONTROL_CHARS = re.compile(r"[\x00-\x20\x7f]+")
+_COLOR = re.compile(r"#[0-9A-Fa-f]{6}")
+
+DEFAULT_BANNER_COLOR = "#FFFFE0"
+DEFAULT_BODY_COLOR = "#FFFFFF"
+
+
+def _safe_url(tag, value):
+    value = _CONTROL_CHARS.sub("", value)
+    if tag == "img" and _SAFE_IMAGE_DATA.match(value):
+        return True
+    return bool(_SAFE_URL.match(value))
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open_tags = []
+        self._dropping = 0
+
+    def _attrs(self, tag, attrs):
+        allowed = GLOBAL_ATTRS | TAG_ATTRS.get(tag, set())
+        parts = []
+        for name, value in attrs:
+            if name not in allowed:
+                continue
+            value = value or ""
+            if name in URL_ATTRS and not _safe_url(tag, value):
+                continue
+            if name == "style" and _UNSAFE_STYLE.search(value):
+                continue
+            parts.append(f' {name}="{html.escape(value, quote=True)}"')
+        if tag == "a" and any(name == "target" for name, _ in attrs):
+            parts.append(' rel="noopener noreferrer"')
+        return "".join(parts)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping += 1
+        if self._dropping or tag not in ALLOWED_TAGS:
+            return
+        if tag == "a":
+            attrs = [(name, value) for name, value in attrs if name != "rel"]
+        self.out.append(f"<{tag}{self._attrs(tag, attrs)}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            if self._dropping:
+                self._dropping -= 1
+            return
+        if self._dropping or tag not in self.open_tags:
+            return
+        # Close anything left open inside this tag so the output stays balanced
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.out.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self._dropping:
+            self.out.append(html.escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return "".join(self.out) + "".join(f"</{tag}>" for tag in reversed(self.open_tags))
+
+
+def sanitize_color(value, default):
+    # Note colors end up in style attributes: anything but #RRGGBB is
+    # replaced by the default
+    return value if isinstance(value, str) and _COLOR.fullmatch(value) else default
+
+
+def sanitize_html(description):
+    if not description:
+        return ""
+    parser = _Sanitizer()
+    parser.feed(description)
+    return parser.result()
+
+
+def render_ready(description, sanitizer_version):
+    # Rows written by an older sanitizer are cleaned on the fly until the
+    # backfill has rewritten them.
+    if sanitizer_version is not None and sanitizer_version >= SANITIZER_VERSION:
+        return description or ""
+    return sanitize_html(description)
+
+
+def backfill(store, batch_size=500, progress=None):
+    # Rewrites every row sanitized by an older version, one short transaction
+    # per batch so the app's writers are never blocked for long.
+    last_id = 0
+    done = 0
+    while True:
+        with store.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, description, description_codec FROM notes"
+                " WHERE id > ? AND sanitizer_version < ? ORDER BY id LIMIT ?",
+                (last_id, SANITIZER_VERSION, batch_size)
+            ).fetchall()
+        if not rows:
+            return done
+        updates = []
+        for note_id, value, codec in rows:
+            stored, codec = store.encode_body(sanitize_html(compression.decode(value, codec)))
+            updates.append((stored, codec, SANITIZER_VERSION, note_id))
+        with store.pool.transaction() as conn:
+            conn.executemany(
+                "UPDATE notes SET description = ?, description_codec = ?, sanitizer_version = ? WHERE id = ?",
+                updates
+            )
+        last_id = rows[-1][0]
+        done += len(rows)
+        if progress:
+            progress(done)
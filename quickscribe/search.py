@@ -0,0 +1,81 @@
+import re
+
+# Ranked full-text search over note headings and bodies (notes_fts, see
+# migrations.py). Results come back in the same row shape as the listing
+# queries so the apps can render them with the normal note grid.
+
+SEARCH_PAGE_SIZE = 30
+
+_TOKEN = re.compile(r"\w+")
+
+# bm25 has to score every match before it can sort, so a word that appears in
+# most notes would be ranked across the whole table. Only the newest
+# RANK_WINDOW matches are ranked: the cut-off rowid comes from walking the
+# doclist backwards, which is cheap, and FTS5 then scores rows above it only.
+# Once those run out, the older matches follow unranked, newest first,
+# keyset-paginated on rowid.
+RANK_WINDOW = 2000
+
+# Rank and paginate inside the FTS table first, then join only one page of
+# hits back to notes for the card columns.
+SEARCH_SQL = (
+    "SELECT notes.id, notes.heading, notes.preview, notes.color, notes.body_color, notes.revision"
+    " FROM (SELECT rowid, rank FROM notes_fts WHERE notes_fts MATCH :query"
+    "       AND rowid >= COALESCE((SELECT rowid FROM notes_fts WHERE notes_fts MATCH :query"
+    "                              ORDER BY rowid DESC LIMIT 1 OFFSET :window), 0)"
+    "       ORDER BY rank LIMIT :limit OFFSET :offset) AS hits"
+    " JOIN notes ON notes.id = hits.rowid"
+    " ORDER BY hits.rank"
+)
+WINDOW_START_SQL = "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?"
+OLDER_SQL = (
+    "SELECT notes.id, notes.heading, notes.preview, notes.color, notes.body_color, notes.revision"
+    " FROM (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? AND rowid < ?"
+    "       ORDER BY rowid DESC LIMIT ?) AS hits"
+    " JOIN notes ON notes.id = hits.rowid"
+    " ORDER BY hits.rowid DESC"
+)
+
+
+# Shorter prefixes match so much of the corpus that ranking them is slow
+MIN_PREFIX_CHARS = 3
+
+
+def match_query(text):
+    # Every word has to match. The last one is treated as a prefix so results
+    # appear while typing. Quoting each token keeps FTS5 query syntax out of
+    # user input.
+    tokens = [f'"{token}"' for token in _TOKEN.findall(text)]
+    if tokens and len(tokens[-1]) - 2 >= MIN_PREFIX_CHARS:
+        tokens[-1] += "*"
+    return " ".join(tokens)
+
+
+def _older(conn, query, before, limit):
+    # Unranked matches below rowid before; the cursor is (last rowid,)
+    rows = conn.execute(OLDER_SQL, (query, before, limit + 1)).fetchall()
+    if len(rows) > limit:
+        return rows[:limit], (rows[limit - 1][0] if limit else before,)
+    return rows, None
+
+
+def search_notes(conn, text, cursor=None, limit=SEARCH_PAGE_SIZE):
+    # Returns (rows, next_cursor) like queries.fetch_page. Within the ranked
+    # window the cursor is an offset, because results are ordered by
+    # relevance, not by a unique key; past it, a (rowid,) tuple.
+    query = match_query(text)
+    if not query:
+        return [], None
+    if isinstance(cursor, tuple):
+        return _older(conn, query, cursor[0], limit)
+    offset = cursor or 0
+    params = {"query": query, "window": RANK_WINDOW - 1, "limit": limit + 1, "offset": offset}
+    rows = conn.execute(SEARCH_SQL, params).fetchall()
+    if len(rows) > limit:
+        return rows[:limit], offset + limit
+    # The ranked window is used up; fill the page from the older matches
+    start = conn.execute(WINDOW_START_SQL, (query, RANK_WINDOW - 1)).fetchone()
+    if start is None:
+        return rows, None
+    older, next_cursor = _older(conn, query, start[0], limit - len(rows))
+    return rows + older, next_cursor
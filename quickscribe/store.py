@@ -0,0 +1,508 @@
+import functools
+import os
+import threading
+from concurrent.futures import Future
+from typing import NamedTuple
+
+from . import (
+    backups,
+    blobs,
+    cache,
+    changes,
+    compression,
+    db,
+    drafts,
+    history,
+    migrations,
+    preview,
+    profiling,
+    queries,
+    sanitize,
+    search,
+    tagging,
+)
+from . import writer as writer_module
+
+# The data layer behind notes.py and notes2.py, free of any UI dependency so
+# scripts, benchmarks and workers can use it without importing Streamlit.
+# Importing the package does no work; creating a NoteStore opens the database,
+# applies pending migrations and makes sure every stored image has a file to
+# serve. A store is meant to live for the whole process: its connection pool
+# and read cache are shared by every session (the apps keep one in
+# st.cache_resource).
+#
+# Defaults for the tuning arguments come from the environment:
+#   QUICKSCRIBE_READ_CACHE_SIZE, QUICKSCRIBE_READ_CACHE_TTL,
+#   QUICKSCRIBE_COMPRESSION, QUICKSCRIBE_COMPRESS_MIN_BYTES,
+#   QUICKSCRIBE_PROFILE, QUICKSCRIBE_PROFILE_SLOW_MS, QUICKSCRIBE_PROFILE_LOG,
+#   QUICKSCRIBE_WRITER, QUICKSCRIBE_WRITER_QUEUE
+
+READ_CACHE_SIZE = 2048
+READ_CACHE_TTL = 300.0
+
+
+class NoteCard(NamedTuple):
+    # What a listing shows: the escaped preview, never the full body
+    id: int
+    heading: str
+    preview: str
+    color: str
+    body_color: str
+    revision: int
+
+
+class Note(NamedTuple):
+    id: int
+    heading: str
+    description: str  # sanitized, render-ready HTML
+    color: str
+    body_color: str
+
+
+class Revision(NamedTuple):
+    revision: int
+    saved_at: str | None  # UTC; None for content from before the note had history
+    heading: str
+    size: int  # body length
+
+
+class Draft(NamedTuple):
+    heading: str
+    description: str
+    tags: str  # as typed in the form
+
+
+# Listings are keyset-paginated; the cursor is the (created_at, id) of the
+# last card on the page ((note_date, created_at, id) for date ranges), None
+# once there are no more pages.
+Cursor = tuple[str, int] | tuple[str, str, int]
+Page = tuple[list[NoteCard], Cursor | None]
+
+
+class PreparedBody(NamedTuple):
+    stored: str | bytes
+    codec: str
+    preview: str
+    search_text: str
+    images: dict[str, tuple[str, bytes]]
+
+
+def prepare_body(description: str | None, codec: str = "",
+                 min_bytes: int = compression.MIN_BYTES) -> PreparedBody:
+    # Everything derived from a note body on write: sanitized HTML with
+    # embedded images moved to the blob store, the card preview and search
+    # text, and the (optionally compressed) value to store.
+    cleaned = description or ""
+    if cleaned.strip() in ["", "<p><br></p>"]:
+        cleaned = ""
+    cleaned, images = blobs.extract_images(sanitize.sanitize_html(cleaned))
+    search_text, note_preview = preview.text_fields(cleaned)
+    stored, codec = compression.encode(cleaned, codec, min_bytes)
+    return PreparedBody(stored, codec, note_preview, search_text, images)
+
+
+def _setting(name, value, default, convert):
+    if value is not None:
+        return value
+    return convert(os.environ.get(f"QUICKSCRIBE_{name}", default))
+
+
+def _flag(value):
+    return str(value).lower() not in ("", "0", "false", "no")
+
+
+def _profiled(method):
+    # A span per call while a rerun is being profiled
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.profiler.enabled:
+            return method(self, *args, **kwargs)
+        with self.profiler.span(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class NoteStore:
+    def __init__(self, db_file: str = "notes.db", *, blob_dir: str | None = None,
+                 pool_size: int = db.POOL_SIZE, read_cache_size: int | None = None,
+                 read_cache_ttl: float | None = None, compression_codec: str | None = None,
+                 compress_min_bytes: int | None = None, profile: bool | None = None,
+                 writer: bool | None = None, backup_dir: str | None = None, export_blobs: bool = False) -> None:
+        self.db_file = db_file
+        self.blob_dir = blob_dir or os.path.join(os.path.dirname(os.path.abspath(db_file)), "static", "blobs")
+        self.compression_codec = _setting("COMPRESSION", compression_codec, "", str)
+        self.compress_min_bytes = _setting("COMPRESS_MIN_BYTES", compress_min_bytes, compression.MIN_BYTES, int)
+        # A TTL of 0 keeps entries until they are invalidated or evicted
+        ttl = _setting("READ_CACHE_TTL", read_cache_ttl, READ_CACHE_TTL, float)
+        self.read_cache = cache.ReadCache(
+            maxsize=_setting("READ_CACHE_SIZE", read_cache_size, READ_CACHE_SIZE, int),
+            ttl=ttl or None,
+        )
+        self.profiler = profiling.Profiler(
+            enabled=_setting("PROFILE", profile, "", _flag),
+            slow_ms=_setting("PROFILE_SLOW_MS", None, profiling.SLOW_MS, float),
+            log_path=os.environ.get("QUICKSCRIBE_PROFILE_LOG"),
+        )
+        self.pool = db.ConnectionPool(db_file, pool_size, self.profiler)
+        self._changes = changes.ChangeFeed(self.pool, self.read_cache)
+        migrations.migrate(self.pool)
+        # The apps serve blob_dir, so they ask for it to be filled; maintenance
+        # commands and benchmarks leave it alone
+        if export_blobs:
+            blobs.export_missing(self.pool, self.blob_dir)
+        # Started on first use, so a store that never touches drafts runs no
+        # drafts thread and does not prune the table
+        self._drafts = None
+        self._drafts_lock = threading.Lock()
+        self.writer = None
+        if _setting("WRITER", writer, "", _flag):
+            self.writer = writer_module.Writer(
+                self.pool, self._committed,
+                max_pending=_setting("WRITER_QUEUE", None, writer_module.MAX_PENDING, int),
+            )
+        # Scheduled online backups, off unless a directory is given
+        self.backups = None
+        backup_dir = _setting("BACKUP_DIR", backup_dir, "", str)
+        if backup_dir:
+            self.backups = backups.Scheduler(
+                self.pool, backup_dir,
+                interval=_setting("BACKUP_INTERVAL", None, backups.INTERVAL, float),
+                keep=_setting("BACKUP_KEEP", None, backups.KEEP, int),
+            )
+
+    def close(self) -> None:
+        if self.backups is not None:
+            self.backups.close()
+        # Queued writes are committed first
+        if self.writer is not None:
+            self.writer.close()
+        if self._drafts is not None:
+            self._drafts.close()
+        self._changes.close()
+        self.pool.close_all()
+
+    def backup(self, directory: str, keep: int = backups.KEEP) -> backups.Report:
+        # An online backup now (see backups.py); the app keeps running
+        return backups.backup(self.pool, directory, keep)
+
+    @_profiled
+    def sync(self) -> int:
+        # Drops cached listings that other processes have changed since the
+        # last call; the apps call it at the top of every rerun.
+        return self._changes.sync()
+
+    def encode_body(self, description: str) -> tuple[str | bytes, str]:
+        return compression.encode(description, self.compression_codec, self.compress_min_bytes)
+
+    @_profiled
+    def prepare_body(self, description: str | None) -> PreparedBody:
+        return prepare_body(description, self.compression_codec, self.compress_min_bytes)
+
+    # Folders
+
+    @_profiled
+    def get_folders(self) -> list[tuple[int, str]]:
+        def load():
+            with self.pool.connection() as conn:
+                return conn.execute("SELECT id, name FROM folders ORDER BY name").fetchall()
+        return self.read_cache.get_or_load(("folders",), None, load)
+
+    @_profiled
+    def get_folder_counts(self) -> dict[int, int]:
+        # {folder_id: number of notes}, empty folders left out. One GROUP BY
+        # over idx_notes_folder, refreshed when notes are added or removed.
+        def load():
+            with self.pool.connection() as conn:
+                return dict(conn.execute(queries.FOLDER_COUNTS).fetchall())
+        return self.read_cache.get_or_load(("folder_counts",), None, load)
+
+    @_profiled
+    def add_folder(self, name: str) -> int:
+        # Raises sqlite3.IntegrityError if a folder with this name exists
+        with self.pool.transaction() as conn:
+            folder_id = conn.execute("INSERT INTO folders (name) VALUES (?)", (name,)).lastrowid
+            seq = changes.latest_seq(conn)
+        self.read_cache.invalidate(("folders",), version=seq)
+        return folder_id
+
+    @_profiled
+    def delete_folder(self, folder_id: int) -> None:
+        # Its notes are deleted with it (ON DELETE CASCADE)
+        with self.pool.transaction() as conn:
+            dates = [row[0] for row in conn.execute(queries.FOLDER_NOTE_DATES, (folder_id,))]
+            conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+            seq = changes.latest_seq(conn)
+        scopes = {("folders",), ("folder_counts",), *cache.note_scopes(folder_id, None)}
+        for note_date in dates:
+            scopes.update(cache.note_scopes(folder_id, note_date))
+        self.read_cache.invalidate(*scopes, version=seq)
+
+    # Notes
+
+    # Note writes run their SQL through _write: inline in the caller's
+    # transaction, or batched with other sessions' writes by the writer
+    # thread. Each *_async variant returns a Future that resolves once the
+    # write is committed; the plain methods wait for it.
+
+    def _write(self, apply, *args) -> Future:
+        if self.writer is not None:
+            return self.writer.submit(apply, *args)
+        future = Future()
+        try:
+            with self.pool.transaction() as conn:
+                outcome = apply(conn, *args)
+                seq = changes.latest_seq(conn)
+            future.set_result(self._committed(outcome, seq))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _committed(self, outcome, seq):
+        # After the commit: serve new images, drop affected listings
+        result, images, scopes = outcome
+        blobs.write_files(self.blob_dir, images)
+        if scopes:
+            self.read_cache.invalidate(*scopes, version=seq)
+        return result
+
+    @staticmethod
+    def _insert_note(conn, heading, body, folder_id, banner_color, body_color, note_date, tags):
+        blobs.insert(conn, body.images)
+        note_id = conn.execute(
+            "INSERT INTO notes (heading, description, description_codec, folder_id, color, body_color, preview,"
+            " search_text, sanitizer_version, note_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (heading, body.stored, body.codec, folder_id, banner_color, body_color, body.preview,
+             body.search_text, sanitize.SANITIZER_VERSION, note_date)
+        ).lastrowid
+        if tags:
+            tagging.set_note_tags(conn, note_id, tags)
+        return note_id, body.images, [*cache.note_scopes(folder_id, note_date), ("folder_counts",)]
+
+    @staticmethod
+    def _update_note(conn, note_id, heading, body, banner_color, body_color, tags):
+        blobs.insert(conn, body.images)
+        before = conn.execute(queries.NOTE_BEFORE_EDIT, (note_id,)).fetchone()
+        if before is None:
+            return None, body.images, ()
+        conn.execute(
+            "UPDATE notes SET heading = ?, description = ?, description_codec = ?, color = ?, body_color = ?,"
+            " preview = ?, search_text = ?, sanitizer_version = ? WHERE id = ?",
+            (heading, body.stored, body.codec, banner_color, body_color, body.preview, body.search_text,
+             sanitize.SANITIZER_VERSION, note_id)
+        )
+        folder_id, note_date, revision, old_heading, old_value, old_codec, created_at = before
+        history.record(
+            conn, note_id,
+            (revision, old_heading, compression.decode(old_value, old_codec) or "", created_at),
+            (conn.execute("SELECT revision FROM notes WHERE id = ?", (note_id,)).fetchone()[0], heading,
+             compression.decode(body.stored, body.codec) or "", None),
+        )
+        if tags is not None:
+            tagging.set_note_tags(conn, note_id, tags)
+        return None, body.images, cache.note_scopes(folder_id, note_date)
+
+    @staticmethod
+    def _delete_note(conn, note_id):
+        location = conn.execute(queries.NOTE_LOCATION, (note_id,)).fetchone()
+        conn.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        return None, {}, [*cache.note_scopes(*location), ("folder_counts",)] if location else ()
+
+    def add_note_async(self, heading: str, description: str | None, folder_id: int | None = None,
+                       banner_color: str = '#FFFFE0', body_color: str = '#FFFFFF',
+                       note_date: str | None = None, tags: list[str] | None = None) -> Future:
+        body = self.prepare_body(description)
+        banner_color = sanitize.sanitize_color(banner_color, sanitize.DEFAULT_BANNER_COLOR)
+        body_color = sanitize.sanitize_color(body_color, sanitize.DEFAULT_BODY_COLOR)
+        return self._write(self._insert_note, heading, body, folder_id, banner_color, body_color, note_date, tags)
+
+    def update_note_async(self, note_id: int, heading: str, description: str | None,
+                          banner_color: str, body_color: str, tags: list[str] | None = None) -> Future:
+        # tags None leaves the note's tags as they are; a list replaces them
+        body = self.prepare_body(description)
+        banner_color = sanitize.sanitize_color(banner_color, sanitize.DEFAULT_BANNER_COLOR)
+        body_color = sanitize.sanitize_color(body_color, sanitize.DEFAULT_BODY_COLOR)
+        return self._write(self._update_note, note_id, heading, body, banner_color, body_color, tags)
+
+    def delete_note_async(self, note_id: int) -> Future:
+        return self._write(self._delete_note, note_id)
+
+    @_profiled
+    def add_note(self, heading: str, description: str | None, folder_id: int | None = None,
+                 banner_color: str = '#FFFFE0', body_color: str = '#FFFFFF',
+                 note_date: str | None = None, tags: list[str] | None = None) -> int:
+        return self.add_note_async(heading, description, folder_id, banner_color, body_color, note_date,
+                                   tags).result()
+
+    @_profiled
+    def update_note(self, note_id: int, heading: str, description: str | None,
+                    banner_color: str, body_color: str, tags: list[str] | None = None) -> None:
+        self.update_note_async(note_id, heading, description, banner_color, body_color, tags).result()
+
+    @_profiled
+    def delete_note(self, note_id: int) -> None:
+        self.delete_note_async(note_id).result()
+
+    @_profiled
+    def get_note(self, note_id: int) -> Note | None:
+        # The only read of the full body
+        with self.pool.connection() as conn:
+            note = conn.execute(queries.NOTE_BY_ID, (note_id,)).fetchone()
+        if note is None:
+            return None
+        description = sanitize.render_ready(compression.decode(note[2], note[6]), note[5])
+        return Note(note[0], note[1], description, note[3], note[4])
+
+    @_profiled
+    def get_card(self, note_id: int) -> NoteCard | None:
+        # A single listing card, uncached; for redrawing one note after a write
+        with self.pool.connection() as conn:
+            row = conn.execute(queries.NOTE_CARD_BY_ID, (note_id,)).fetchone()
+        return NoteCard._make(row) if row else None
+
+    # History (see history.py)
+
+    @_profiled
+    def get_revisions(self, note_id: int) -> list[Revision]:
+        # Newest first; empty until the note's first edit
+        with self.pool.connection() as conn:
+            return [Revision._make(row) for row in history.revisions(conn, note_id)]
+
+    @_profiled
+    def get_revision(self, note_id: int, revision: int) -> tuple[str, str] | None:
+        # (heading, description) as saved in that revision
+        with self.pool.connection() as conn:
+            return history.content(conn, note_id, revision)
+
+    @_profiled
+    def diff_revisions(self, note_id: int, old: int, new: int | None = None) -> str:
+        # Unified diff between two revisions, or from old to the current note
+        # when new is None; raises KeyError for a revision that is not stored
+        with self.pool.connection() as conn:
+            before = history.content(conn, note_id, old)
+            if new is None:
+                row = conn.execute(queries.NOTE_BY_ID, (note_id,)).fetchone()
+                after = (row[1], compression.decode(row[2], row[6]) or "") if row else None
+            else:
+                after = history.content(conn, note_id, new)
+        if before is None or after is None:
+            raise KeyError(f"note {note_id} has no revision {old if before is None else new}")
+        return history.diff(before, after, f"revision {old}", "current" if new is None else f"revision {new}")
+
+    @_profiled
+    def restore_revision(self, note_id: int, revision: int) -> None:
+        # Saved as a new edit, so a restore can itself be undone
+        content = self.get_revision(note_id, revision)
+        note = self.get_note(note_id)
+        if content is None or note is None:
+            raise KeyError(f"note {note_id} has no revision {revision}")
+        self.update_note(note_id, content[0], content[1], note.color, note.body_color)
+
+    # Drafts (see drafts.py). owner identifies the browser tab; note_id 0 is
+    # the new-note form.
+
+    @property
+    def drafts(self) -> drafts.Drafts:
+        with self._drafts_lock:
+            if self._drafts is None:
+                self._drafts = drafts.Drafts(self.pool,
+                                             debounce=_setting("DRAFT_DEBOUNCE", None, drafts.DEBOUNCE, float))
+            return self._drafts
+
+    @_profiled
+    def get_draft(self, owner: str, note_id: int) -> Draft | None:
+        content = self.drafts.get(owner, note_id)
+        return Draft._make(content) if content else None
+
+    def save_draft(self, owner: str, note_id: int, draft: Draft | None) -> None:
+        # Kept in memory and written in the background a few seconds later;
+        # None drops the draft (the form matches the saved note again)
+        self.drafts.put(owner, note_id, draft)
+
+    @_profiled
+    def discard_draft(self, owner: str, note_id: int) -> None:
+        # After the note is saved, or the edit cancelled
+        self.drafts.discard(owner, note_id)
+
+    # Tags
+
+    @_profiled
+    def get_tags(self) -> list[tuple[str, int]]:
+        # (name, number of notes) for every tag in use, by name
+        def load():
+            with self.pool.connection() as conn:
+                return conn.execute(queries.TAGS_IN_USE).fetchall()
+        return self.read_cache.get_or_load(("tags",), None, load)
+
+    @_profiled
+    def get_note_tags(self, note_id: int) -> list[str]:
+        with self.pool.connection() as conn:
+            return [row[0] for row in conn.execute(queries.NOTE_TAG_NAMES, (note_id,))]
+
+    # Listings
+
+    def _page(self, scope, key, query, params, cursor, limit):
+        def load():
+            with self.pool.connection() as conn:
+                rows, next_cursor = queries.fetch_page(conn, query, params, cursor, limit)
+            return [NoteCard._make(row) for row in rows], next_cursor
+        return self.read_cache.get_or_load(scope, key, load)
+
+    @_profiled
+    def get_notes_by_folder(self, folder_id: int | None, cursor: Cursor | None = None,
+                            limit: int = queries.PAGE_SIZE, include_dated: bool = False) -> Page:
+        # folder_id None is Home. Dated notes belong to the date view unless
+        # include_dated is set (notes.py has no date view).
+        if include_dated:
+            query = queries.ALL_NOTES_IN_HOME if folder_id is None else queries.ALL_NOTES_IN_FOLDER
+        else:
+            query = queries.NOTES_IN_HOME if folder_id is None else queries.NOTES_IN_FOLDER
+        params = () if folder_id is None else (folder_id,)
+        return self._page(("folder", folder_id), (include_dated, cursor, limit), query, params, cursor, limit)
+
+    @_profiled
+    def get_notes_by_date(self, note_date: str, cursor: Cursor | None = None,
+                          limit: int = queries.PAGE_SIZE) -> Page:
+        return self._page(("date", note_date), (cursor, limit), queries.NOTES_ON_DATE, (note_date,), cursor, limit)
+
+    @_profiled
+    def get_notes_in_range(self, start: str, end: str, cursor: Cursor | None = None,
+                           limit: int = queries.PAGE_SIZE) -> Page:
+        # Dated notes with start <= note_date < end, newest day first
+        return self._page(("calendar",), ("range", start, end, cursor, limit), queries.NOTES_IN_RANGE,
+                          (start, end), cursor, limit)
+
+    @_profiled
+    def get_day_counts(self, start: str, end: str) -> dict[str, int]:
+        # {note_date: number of notes} for start <= note_date < end, days
+        # without notes left out. One GROUP BY over the dated-notes index.
+        def load():
+            with self.pool.connection() as conn:
+                return dict(conn.execute(queries.DAY_COUNTS, (start, end)).fetchall())
+        return self.read_cache.get_or_load(("calendar",), ("days", start, end), load)
+
+    @_profiled
+    def get_notes_by_tags(self, tags: list[str], match_all: bool = True, cursor: Cursor | None = None,
+                          limit: int = queries.PAGE_SIZE) -> Page:
+        # Notes carrying every one of the tags (match_all) or any of them
+        names = tagging.normalize(tags)
+
+        def load():
+            with self.pool.connection() as conn:
+                found = tagging.find(conn, names)
+                if not found or match_all and len(found) < len(names):
+                    return [], None
+                tag_ids = [tag_id for tag_id, _ in found]
+                rows, next_cursor = queries.fetch_page(conn, queries.notes_with_tags(len(tag_ids), match_all),
+                                                       tag_ids, cursor, limit)
+            return [NoteCard._make(row) for row in rows], next_cursor
+        key = (tuple(sorted(name.casefold() for name in names)), match_all, cursor, limit)
+        return self.read_cache.get_or_load(("tags",), key, load)
+
+    @_profiled
+    def search_notes(self, text: str, cursor: int | tuple[int] | None = None,
+                     limit: int = search.SEARCH_PAGE_SIZE) -> tuple[list[NoteCard], int | tuple[int] | None]:
+        # Ranked by relevance, then older matches beyond search.RANK_WINDOW
+        # newest first; see search.search_notes for the cursor
+        with self.pool.connection() as conn:
+            rows, next_cursor = search.search_notes(conn, text, cursor, limit)
+        return [NoteCard._make(row) for row in rows], next_cursor
@@ -0,0 +1,45 @@
+from . import queries
+
+# Tags: any number per note, kept in a normalized tags table and the
+# note_tags junction table (see migrations.py). note_tags is keyed on
+# (tag_id, created_at, note_id), so each tag's notes are stored in listing
+# order and a tag filter pages through them like a folder listing; the
+# (note_id, tag_id) index answers "which tags does this note have" and lets
+# an AND filter probe the other tags for every note of the rarest one.
+# tags.note_count is kept up to date by triggers, for the sidebar and to
+# pick that rarest tag.
+
+
+def normalize(names):
+    # Trimmed, inner whitespace collapsed, a leading '#' dropped, and
+    # case-insensitive duplicates removed (the first spelling wins)
+    found = {}
+    for name in names or ():
+        name = " ".join(name.strip().lstrip("#").split())
+        if name:
+            found.setdefault(name.casefold(), name)
+    return list(found.values())
+
+
+def find(conn, names):
+    # [(tag_id, note_count)] for the tags that exist, rarest first
+    if not names:
+        return []
+    placeholders = ", ".join("?" * len(names))
+    return conn.execute(
+        f"SELECT id, note_count FROM tags WHERE name IN ({placeholders}) ORDER BY note_count, id", names
+    ).fetchall()
+
+
+def set_note_tags(conn, note_id, names):
+    # Replaces the note's tags, inside the caller's write transaction
+    names = normalize(names)
+    conn.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(name,) for name in names])
+    wanted = {tag_id for tag_id, _ in find(conn, names)}
+    current = {row[0] for row in conn.execute(queries.NOTE_TAG_IDS, (note_id,))}
+    conn.executemany("DELETE FROM note_tags WHERE note_id = ? AND tag_id = ?",
+                     [(note_id, tag_id) for tag_id in current - wanted])
+    conn.executemany(
+        "INSERT INTO note_tags (tag_id, created_at, note_id) SELECT ?, created_at, id FROM notes WHERE id = ?",
+        [(tag_id, note_id) for tag_id in wanted - current]
+    )
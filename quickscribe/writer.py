@@ -0,0 +1,138 @@
+import atexit
+import concurrent.futures
+import queue
+import threading
+import time
+
+from . import changes
+
+# Optional single writer thread (NoteStore(writer=True) or QUICKSCRIBE_WRITER=1).
+# Sessions still sanitize note bodies in their own thread, then queue the SQL
+# part of add/update/delete_note here. The writer takes whatever has queued up
+# (up to max_batch) and applies it in one BEGIN IMMEDIATE transaction, each
+# write in its own savepoint so a failing one does not take the batch down.
+# Under load saves share commits instead of queueing on SQLite's write lock
+# one by one; when idle a batch is a single write and costs what an inline
+# save does.
+#
+# Futures resolve only after the commit. A full queue blocks submit() for up
+# to submit_timeout seconds and then raises WriterBusy. close() (also run at
+# interpreter exit) stops accepting writes and commits everything queued.
+# submit() queues while holding the lock close() takes to stop accepting
+# writes, so nothing can be queued behind _STOP and never resolve.
+
+MAX_PENDING = 1000
+MAX_BATCH = 200
+SUBMIT_TIMEOUT = 10.0
+
+_STOP = object()
+
+
+class WriterBusy(RuntimeError):
+    pass
+
+
+class Writer:
+    def __init__(self, pool, on_commit, max_pending=MAX_PENDING, max_batch=MAX_BATCH,
+                 submit_timeout=SUBMIT_TIMEOUT):
+        # on_commit(outcome, seq) runs on the writer thread after each commit
+        # for every write that succeeded; it returns the future's result.
+        self._pool = pool
+        self._on_commit = on_commit
+        self.max_batch = max_batch
+        self.submit_timeout = submit_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.batches = 0
+        self.writes = 0
+        self.largest_batch = 0
+        self._thread = threading.Thread(target=self._run, name="quickscribe-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, apply, *args):
+        # apply(conn, *args) runs inside the batch transaction
+        future = concurrent.futures.Future()
+        deadline = time.monotonic() + self.submit_timeout
+        # Other submits wait here while one waits on a full queue
+        if not self._lock.acquire(timeout=self.submit_timeout):
+            raise WriterBusy(f"{self._queue.maxsize} writes already queued")
+        try:
+            if self._closed:
+                raise RuntimeError("writer is closed")
+            self._queue.put((future, apply, args), timeout=max(0, deadline - time.monotonic()))
+        except queue.Full:
+            raise WriterBusy(f"{self._queue.maxsize} writes already queued") from None
+        finally:
+            self._lock.release()
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {"batches": self.batches, "writes": self.writes, "largest_batch": self.largest_batch,
+                "pending": self.pending()}
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit([entry for entry in batch if entry[0].set_running_or_notify_cancel()])
+            if stop:
+                return
+
+    def _commit(self, batch):
+        applied = []
+        try:
+            with self._pool.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for future, apply, args in batch:
+                    conn.execute("SAVEPOINT write")
+                    try:
+                        outcome = apply(conn, *args)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write")
+                        conn.execute("RELEASE write")
+                        future.set_exception(e)
+                        continue
+                    conn.execute("RELEASE write")
+                    applied.append((future, outcome))
+                seq = changes.latest_seq(conn)
+                conn.commit()
+        except Exception as e:
+            # Nothing was committed
+            for future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += len(applied)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for future, outcome in applied:
+            try:
+                future.set_result(self._on_commit(outcome, seq))
+            except Exception as e:
+                future.set_exception(e)
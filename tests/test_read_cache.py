@@ -0,0 +1,49 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from quickscribe import NoteStore
+
+
+class ResetRaceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "notes.db")
+        self.store = NoteStore(self.db_file, blob_dir=os.path.join(self.tmp.name, "blobs"))
+        self.store.sync()
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_load_racing_reset_is_not_served_after_it(self):
+        # A load reads the folders, another process adds one and this
+        # process resets its cache, then the load stores what it read
+        read = threading.Event()
+        release = threading.Event()
+
+        def load():
+            with self.store.pool.connection() as conn:
+                rows = conn.execute("SELECT id, name FROM folders ORDER BY name").fetchall()
+            read.set()
+            release.wait(5)
+            return rows
+
+        loader = threading.Thread(target=self.store.read_cache.get_or_load, args=(("folders",), None, load))
+        loader.start()
+        self.assertTrue(read.wait(5))
+        other = sqlite3.connect(self.db_file)
+        with other:
+            other.execute("INSERT INTO folders (name) VALUES ('Added elsewhere')")
+        other.close()
+        self.store._changes._reset()
+        release.set()
+        loader.join()
+
+        self.assertEqual([name for _, name in self.store.get_folders()], ["Added elsewhere"])
+
+
+if __name__ == "__main__":
+    unittest.main()